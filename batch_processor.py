@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import cv2
+
+from config import *
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+SESSION_EXTENSION = '.vps'
+
+# Each worker process keeps one HandTracker, so the model loads once per
+# process instead of once per file
+_hand_tracker = None
+_options = None
+
+def find_inputs(paths):
+    """Expand files and directories into a sorted list of videos and recorded sessions."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS + (SESSION_EXTENSION,)):
+                    inputs.append(os.path.join(path, name))
+        else:
+            inputs.append(path)
+    return inputs
+
+def _init_worker(options):
+    """Create the worker's HandTracker, running inference in this process."""
+    global _hand_tracker, _options
+    from hand_tracker import HandTracker
+
+    # The pool already uses every core; more threads per worker only contend
+    cv2.setNumThreads(1)
+    _options = options
+    _hand_tracker = HandTracker(use_process=False)
+
+def _process_file(path):
+    """Paint one video or session headless and save the result. Runs in a worker."""
+    from virtual_painter_enhanced import VirtualPainter
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    output_dir = _options['output_dir']
+    result = {'path': path, 'frames': 0, 'seconds': 0.0, 'outputs': [], 'error': None}
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            video_path = os.path.join(output_dir, f"{stem}.mp4") if _options['render'] else None
+            if path.endswith(SESSION_EXTENSION):
+                painter = VirtualPainter(replay_path=path, headless=True, output_path=video_path,
+                                         replay_inference=_options['inference'],
+                                         hand_tracker=_hand_tracker, target_fps=0)
+            else:
+                painter = VirtualPainter(source=f"video:{path}", headless=True, output_path=video_path,
+                                         hand_tracker=_hand_tracker, target_fps=0)
+            painter.run()
+
+            if video_path:
+                result['outputs'] += [video_path, os.path.splitext(video_path)[0] + "_canvas.png"]
+            else:
+                canvas_path = os.path.join(output_dir, f"{stem}_canvas.png")
+                cv2.imwrite(canvas_path, painter.canvas_manager.get_canvas())
+                result['outputs'].append(canvas_path)
+        result['frames'] = painter.cap.frames_read
+        if painter.error is not None:
+            result['error'] = str(painter.error)
+    except Exception as e:
+        result['error'] = str(e)
+    except SystemExit:
+        result['error'] = (log.getvalue().strip().splitlines() or ["exited"])[-1]
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def main():
+    """Process many recorded videos or sessions in parallel."""
+    parser = argparse.ArgumentParser(description="Batch-process recorded Virtual Painter sessions")
+    parser.add_argument('inputs', nargs='+', help="video files, .vps sessions or directories of them")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument('--output-dir', default=SAVE_DIRECTORY,
+                        help="where results are written (default: %(default)s)")
+    parser.add_argument('--render', action='store_true',
+                        help="also render each input to a composited video")
+    parser.add_argument('--inference', action='store_true',
+                        help="re-run hand inference on recorded sessions instead of using their landmarks")
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("❌ No videos or sessions found.")
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(inputs)))
+    options = {'output_dir': args.output_dir, 'render': args.render, 'inference': args.inference}
+    print(f"🎬 Processing {len(inputs)} files with {workers} workers...")
+
+    start = time.perf_counter()
+    total_frames = 0
+    busy_time = 0.0
+    failures = 0
+    # Spawned workers start clean, without inheriting threads from this process
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+        for done, result in enumerate(pool.imap_unordered(_process_file, inputs), 1):
+            name = os.path.basename(result['path'])
+            fps = result['frames'] / max(result['seconds'], 1e-9)
+            if result['error']:
+                failures += 1
+                print(f"❌ [{done}/{len(inputs)}] {name}: {result['error']}")
+            else:
+                print(f"✅ [{done}/{len(inputs)}] {name}: {result['frames']} frames in "
+                      f"{result['seconds']:.1f}s ({fps:.1f} FPS) -> {', '.join(result['outputs'])}")
+            total_frames += result['frames']
+            busy_time += result['seconds']
+
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {len(inputs) - failures}/{len(inputs)} files, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / max(elapsed, 1e-9):.1f} FPS overall, "
+          f"{busy_time / max(elapsed, 1e-9):.1f} workers busy on average)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from config import *
+from frame_source import SyntheticSource
+from session_recorder import NO_KEY
+
+SIZES = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+def synthetic_hand(x, y, fingers_up, scale=60.0):
+    """Build pixel-coordinate (21, 3) landmarks of a hand with the given fingers raised.
+
+    fingers_up is [thumb, index, middle, ring, pinky]; the index tip lands on (x, y).
+    """
+    hand = np.zeros((21, 3), np.float32)
+    hand[:, 0] = x
+    hand[:, 1] = y + scale  # Everything starts level with the knuckles
+    for finger, (tip, joint) in enumerate(zip([4, 8, 12, 16, 20], [3, 6, 10, 14, 18])):
+        hand[joint, 1] = y + scale
+        if finger == 0:
+            hand[tip, 0] = x + (0.3 if fingers_up[0] else -0.3) * scale
+        else:
+            hand[tip, 1] = y if fingers_up[finger] else y + 1.5 * scale
+    hand[8, :2] = (x, y) if fingers_up[1] else (x, y + 1.5 * scale)
+    return hand
+
+GESTURE_FINGERS = {
+    'drawing': [0, 1, 0, 0, 0],
+    'selection': [0, 1, 1, 0, 0],
+    'eraser': [0, 0, 0, 0, 0],
+    'none': [1, 1, 1, 1, 1],
+}
+
+# A repeating script of (gesture, frames): mostly drawing, with erasing,
+# choosing a color in the header and some time with no gesture
+GESTURE_SCRIPT = [('drawing', 90), ('none', 15), ('eraser', 30), ('selection', 15), ('drawing', 60)]
+
+class SyntheticSession(SyntheticSource):
+    def __init__(self, width, height, num_frames):
+        """Synthetic frames paired with a scripted landmark stream, replayed like a session."""
+        super().__init__(width, height, num_frames)
+        self.landmarks = np.empty((0, 21, 3), np.float32)
+        self.key = NO_KEY
+        self.frame_count = num_frames
+        self.script = [gesture for gesture, frames in GESTURE_SCRIPT for _ in range(frames)]
+
+    @property
+    def position(self):
+        return self.frames_read
+
+    def _read_into(self, frame):
+        success, frame = super()._read_into(frame)
+        if success:
+            i = self.frames_read
+            gesture = self.script[i % len(self.script)]
+            t = i * 0.04
+            x = self.width * (0.5 + 0.35 * np.sin(t))
+            y = self.height * (0.55 + 0.3 * np.sin(2 * t + 0.5))
+            if gesture == 'selection':
+                y = BUTTON_HEIGHT / 2  # Over the color buttons
+            self.landmarks = synthetic_hand(x, y, GESTURE_FINGERS[gesture])[None]
+        return success, frame
+
+def measure(fn, repeat, setup=None, warmup=5):
+    """Time fn over repeat calls. Returns (median, p95) in microseconds."""
+    times = []
+    for i in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    times = np.array(times) * 1e6
+    return float(np.median(times)), float(np.percentile(times, 95))
+
+def benchmark_canvas(results, label, width, height, repeat):
+    """Benchmark the canvas operations at one canvas size."""
+    from canvas_manager import CanvasManager
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas = CanvasManager(width, height)
+    rng = np.random.default_rng(0)
+    canvas.set_drawing_mode()
+    canvas.set_brush_size(25)
+
+    def random_point():
+        return (int(rng.integers(0, width)), int(rng.integers(0, height)))
+
+    def short_segment():
+        x, y = random_point()
+        return (x, y), (min(x + 40, width - 1), min(y + 25, height - 1))
+
+    segments = [short_segment() for _ in range(64)]
+    state = {'i': 0}
+    def draw_segment():
+        start, end = segments[state['i'] % len(segments)]
+        state['i'] += 1
+        canvas.draw_line(start, end)
+    results[f'canvas.draw_line[{label}]'] = measure(draw_segment, repeat)
+
+    results[f'canvas.save_state[{label}]'] = measure(canvas.save_state, repeat, setup=draw_segment)
+
+    # Undo and redo the same stroke back and forth
+    draw_segment()
+    canvas.save_state()
+    results[f'canvas.undo[{label}]'] = measure(lambda: (canvas.undo(), canvas.redo()), repeat)
+
+    frame = np.full((height, width, 3), 90, np.uint8)
+    results[f'canvas.get_canvas_overlay[{label}]'] = measure(
+        lambda: canvas.get_canvas_overlay(frame), repeat, setup=draw_segment)
+    results[f'canvas.get_drawing_info[{label}]'] = measure(canvas.get_drawing_info, repeat)
+
+def benchmark_ui(results, label, width, height, repeat):
+    """Benchmark header and overlay drawing at one frame size."""
+    from ui_manager import UIManager
+    from canvas_manager import CanvasManager
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ui = UIManager(width, height)
+        canvas_info = CanvasManager(width, height).get_drawing_info()
+    frame = np.full((height, width, 3), 90, np.uint8)
+
+    results[f'ui.draw_header[{label}]'] = measure(lambda: ui.draw_header(frame), repeat)
+    results[f'ui.draw_ui_layer[{label}]'] = measure(lambda: ui.draw_ui_layer(frame, canvas_info), repeat)
+    ui.toggle_help()
+    results[f'ui.draw_help_overlay[{label}]'] = measure(lambda: ui.draw_help_overlay(frame), repeat)
+    ui.toggle_info()
+    results[f'ui.draw_info_overlay[{label}]'] = measure(
+        lambda: ui.draw_info_overlay(frame, canvas_info), repeat)
+
+def benchmark_gestures(results, repeat):
+    """Benchmark finger state and gesture checks on uncached landmarks."""
+    from hand_tracker import HandTracker
+
+    hand_tracker = HandTracker(motion_gate=False)
+    hands = [synthetic_hand(300, 300, fingers) for fingers in GESTURE_FINGERS.values()]
+    state = {'i': 0}
+    def next_hand():
+        state['i'] += 1
+        return hands[state['i'] % len(hands)]
+
+    results['hand_tracker.get_finger_state'] = measure(
+        lambda: hand_tracker.get_finger_state(next_hand()), repeat)
+    results['hand_tracker.gesture_checks'] = measure(
+        lambda: [check(next_hand()) for check in (hand_tracker.is_selection_gesture,
+                                                  hand_tracker.is_drawing_gesture,
+                                                  hand_tracker.is_eraser_gesture,
+                                                  hand_tracker.is_eraser_gesture_alternative)],
+        repeat)
+    results['hand_tracker.classify_hands[2]'] = measure(
+        lambda: hand_tracker.classify_hands(np.stack(hands[:2])), repeat)
+    hand_tracker.release()
+
+def benchmark_end_to_end(results, label, width, height, frames, inference):
+    """Run the whole painter headless on synthetic frames and a scripted hand."""
+    from virtual_painter_enhanced import VirtualPainter
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        # Replayed like a recorded session, through the same constructor path as
+        # --replay; the scripted landmarks are used unless MediaPipe should run
+        painter = VirtualPainter(player=SyntheticSession(width, height, frames), headless=True,
+                                 replay_inference=inference, canvas_size=(width, height))
+        start = time.perf_counter()
+        painter.run()
+        elapsed = time.perf_counter() - start
+
+    stats = painter.latency.get_stats()
+    if 'frame' not in stats or painter.latency.counts['frame'] < frames:
+        print(f"❌ {label}: end-to-end run stopped early")
+        print(log.getvalue())
+        return
+    p50, p95, _ = stats['frame']
+    results[f'end_to_end.frame[{label}]'] = (p50 * 1e6, p95 * 1e6)
+    print(f"   {label}: {frames} frames in {elapsed:.2f}s ({frames / elapsed:.1f} FPS)")
+
+def compare(results, baseline, threshold):
+    """List (name, baseline, current) for results slower than the baseline by more than threshold."""
+    regressions = []
+    for name, (median, _) in results.items():
+        if name in baseline and median > baseline[name][0] * (1 + threshold):
+            regressions.append((name, baseline[name][0], median))
+    return regressions
+
+def main():
+    """Run the benchmarks and check them against a baseline."""
+    parser = argparse.ArgumentParser(description="Headless Virtual Painter benchmarks")
+    parser.add_argument('--sizes', default='480p,720p,1080p,4k',
+                        help="comma-separated sizes from: " + ", ".join(SIZES))
+    parser.add_argument('--repeat', type=int, default=50, help="timed calls per micro-benchmark")
+    parser.add_argument('--frames', type=int, default=300, help="frames per end-to-end run")
+    parser.add_argument('--inference', action='store_true',
+                        help="run MediaPipe in the end-to-end loop instead of scripted landmarks")
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--baseline', metavar='FILE', help="compare with results saved in FILE")
+    parser.add_argument('--save-baseline', metavar='FILE', help="save these results to FILE")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="slowdown over the baseline median that counts as a regression")
+    args = parser.parse_args()
+
+    sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        print(f"❌ Unknown sizes: {', '.join(unknown)}")
+        return 2
+
+    results = {}
+    print("⏱️  Micro-benchmarks...")
+    for label in sizes:
+        width, height = SIZES[label]
+        benchmark_canvas(results, label, width, height, args.repeat)
+        benchmark_ui(results, label, width, height, args.repeat)
+    benchmark_gestures(results, args.repeat * 10)
+
+    if not args.skip_end_to_end:
+        print("⏱️  End-to-end...")
+        for label in sizes:
+            width, height = SIZES[label]
+            benchmark_end_to_end(results, label, width, height, args.frames, args.inference)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print(f"\n{'benchmark':<44}{'median µs':>12}{'p95 µs':>12}{'baseline':>12}")
+    for name, (median, p95) in results.items():
+        reference = f"{baseline[name][0]:.1f}" if name in baseline else "-"
+        print(f"{name:<44}{median:>12.1f}{p95:>12.1f}{reference:>12}")
+
+    if args.save_baseline:
+        directory = os.path.dirname(args.save_baseline)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'results': results}, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions beyond {args.threshold:.0%}:")
+            for name, before, after in regressions:
+                print(f"   {name}: {before:.1f} → {after:.1f} µs ({after / before - 1:+.0%})")
+            return 1
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
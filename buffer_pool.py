@@ -0,0 +1,33 @@
+import numpy as np
+from config import *
+
+class BufferPool:
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+        """Initialize a pool of named scratch buffers for per-frame work.
+
+        Buffers are sized for a width x height 3-channel frame to start with, and
+        any smaller shape is a view into the same memory, so steady-state frames
+        (including varying crop sizes) allocate nothing.
+        """
+        self.default_size = width * height * 3
+        self.buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Get a contiguous array of the given shape backed by the named buffer.
+
+        Its contents are whatever was written last; it stays valid until the
+        next get() of the same name.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.nbytes < nbytes:
+            buffer = np.empty(max(nbytes, self.default_size), np.uint8)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:nbytes].view(dtype).reshape(shape)
+
+    def memory_used(self):
+        """Bytes held by all buffers."""
+        return sum(buffer.nbytes for buffer in self.buffers.values())
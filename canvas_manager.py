@@ -5,19 +5,46 @@ import numpy as np
 import os
 from datetime import datetime
 from config import *
+from stroke_store import StrokeStore
+from buffer_pool import BufferPool
 
 class CanvasManager:
-    def __init__(self, width=CANVAS_WIDTH, height=CANVAS_HEIGHT):
-        """Initialize the canvas manager."""
+    def __init__(self, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, buffers=None,
+                 master_size=MASTER_CANVAS_SIZE, max_strokes=UNDO_MAX_STROKES, max_points=UNDO_MAX_POINTS):
+        """Initialize the canvas manager.
+        
+        Drawing coordinates are in the width x height display canvas, but paint
+        goes into a master canvas a whole number of times larger, with its long
+        side up to master_size, from which the display view is kept up to date.
+        At most max_strokes strokes of max_points points in all stay undoable;
+        compact_history() flattens older ones.
+        """
         self.width = width
         self.height = height
-        self.canvas = np.zeros((height, width, 3), np.uint8)
-        self.canvas.fill(0)  # Black background
+        self.master_size = master_size
+        self.buffers = buffers if buffers is not None else BufferPool(width, height)
+        # Premultiplied BGRA: alpha is real paint coverage, so black is drawable
+        self._set_master_size()
+        self.canvas = np.zeros((self.master_height, self.master_width, 4), np.uint8)
+        self.canvas.fill(0)  # Fully transparent
+        
+        # Every stroke is also kept as vectors: undo/redo redraw only the strokes
+        # around the affected area, and drawings save resolution-independently
+        self.strokes = StrokeStore()
+        self._flattened = StrokeStore()  # Strokes past the undo budget, kept for saving
+        self._image = None  # Loaded raster image under all strokes
+        self._base = None  # Redraw cache: the image with the flattened strokes on it
+        self.max_strokes = max_strokes
+        self.max_points = max_points
         
-        # History for undo/redo
-        self.history = []
-        self.history_index = -1
-        self.max_history = 50
+        # Overlay cache: paint color and inverse coverage at display size, only
+        # downsampled from the master inside dirty rects, so compositing is a single blend
+        self._dirty_rects = []
+        self._allocate_overlay_cache()
+        
+        # Drawing statistics, kept up to date by the methods that change the canvas
+        self.version = 0
+        self._pixels_drawn = 0
         
         # Drawing state
         self.last_point = None
@@ -32,59 +59,144 @@ class CanvasManager:
     def resize_canvas(self, new_width, new_height):
         """Resize the canvas to new dimensions."""
         if new_width != self.width or new_height != self.height:
-            # Create new canvas with new dimensions
-            new_canvas = np.zeros((new_height, new_width, 3), np.uint8)
-            new_canvas.fill(0)
-            
-            # Copy existing content (if any)
-            if self.canvas is not None:
-                # Resize existing canvas content to fit new dimensions
-                resized_content = cv2.resize(self.canvas, (new_width, new_height))
-                new_canvas = resized_content
-            
-            self.canvas = new_canvas
+            old_width, old_height = self.master_width, self.master_height
             self.width = new_width
             self.height = new_height
+            self._set_master_size()
+            master_rect = (0, 0, self.master_width, self.master_height)
+            
+            # Strokes are redrawn sharp at the new size; only a loaded image is resampled
+            self.strokes.end()
+            self.strokes.scale(self.master_width / old_width, self.master_height / old_height)
+            self._flattened.scale(self.master_width / old_width, self.master_height / old_height)
+            if self._image is not None:
+                self._image = cv2.resize(self._image, (self.master_width, self.master_height))
+            
+            self.canvas = np.zeros((self.master_height, self.master_width, 4), np.uint8)
+            self._rebuild_base()
+            self._redraw(master_rect)
+            self.last_point = None
+            self._allocate_overlay_cache()
+            self._dirty_rects = [master_rect]
+            self._pixels_drawn = self._count_painted(master_rect)
+            self.version += 1
             print(f"Canvas resized to: {new_width}x{new_height}")
     
     def clear_canvas(self):
         """Clear the canvas and reset history."""
-        self.canvas = np.zeros((self.height, self.width, 3), np.uint8)
         self.canvas.fill(0)
-        self.history = []
-        self.history_index = -1
+        self.strokes.reset()
+        self._flattened.reset()
+        self._image = None
+        self._base = None
+        self._overlay_color.fill(0)
+        self._overlay_inv_alpha.fill(255)
+        self._painted_rect = None
+        self._dirty_rects = []
+        self._pixels_drawn = 0
+        self.version += 1
         self.last_point = None
     
-    def save_state(self):
-        """Save current canvas state to history."""
-        # Remove any states after current index
-        self.history = self.history[:self.history_index + 1]
+    def _set_master_size(self):
+        """Pick the whole-number scale from the display canvas to the master."""
+        # Whole display pixels then map onto whole blocks of master pixels
+        self.scale = max(1, self.master_size // max(self.width, self.height))
+        self.master_width = self.width * self.scale
+        self.master_height = self.height * self.scale
+    
+    def _to_master(self, point):
+        """Map a display point to the center of its block in the master canvas."""
+        return (int(point[0]) * self.scale + self.scale // 2,
+                int(point[1]) * self.scale + self.scale // 2)
+    
+    def _allocate_overlay_cache(self):
+        """Allocate the compositing caches for an empty canvas."""
+        self._overlay_color = np.zeros((self.height, self.width, 3), np.uint8)
+        self._overlay_inv_alpha = np.full((self.height, self.width, 3), 255, np.uint8)
+        self._painted_rect = None  # Bounds of everything that may be painted
+        self._frame_overlay = None  # Caches resized to a differently sized frame
+        self._frame_overlay_key = None
+    
+    def _clip_rect(self, rect):
+        """Clip a master rect (x1, y1, x2, y2) to the canvas, or None if nothing is left."""
+        x1, y1 = max(rect[0], 0), max(rect[1], 0)
+        x2, y2 = min(rect[2], self.master_width), min(rect[3], self.master_height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (x1, y1, x2, y2)
+    
+    def _count_painted(self, rect):
+        """Count painted pixels inside a clipped rect."""
+        if rect is None:
+            return 0
+        x1, y1, x2, y2 = rect
+        alpha = self.buffers.get('canvas_alpha', (y2 - y1, x2 - x1))
+        return cv2.countNonZero(cv2.extractChannel(self.canvas[y1:y2, x1:x2], 3, dst=alpha))
+    
+    def _mark_dirty(self, rect):
+        """Record an area that changed since the last overlay was composited."""
+        rect = self._clip_rect(rect) if rect else None
+        if rect is None:
+            return
+        self._dirty_rects.append(rect)
         
-        # Add current state
-        state = self.canvas.copy()
-        self.history.append(state)
-        self.history_index += 1
+        # Coalesce rather than let the list grow while no overlay is drawn
+        if len(self._dirty_rects) > 32:
+            xs1, ys1, xs2, ys2 = zip(*self._dirty_rects)
+            self._dirty_rects = [(min(xs1), min(ys1), max(xs2), max(ys2))]
+    
+    def _redraw(self, rect):
+        """Rebuild the canvas inside rect from the loaded image and the strokes that reach it."""
+        rect = self._clip_rect(rect)
+        if rect is None:
+            return
+        x1, y1, x2, y2 = rect
         
-        # Limit history size
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-            self.history_index -= 1
+        # Strokes are drawn whole into a scratch canvas and only rect is copied
+        # back, so the pixels come out exactly as when they were drawn live
+        scratch = self.buffers.get('stroke_raster', self.canvas.shape)
+        region = scratch[y1:y2, x1:x2]
+        if self._base is not None:
+            region[...] = self._base[y1:y2, x1:x2]
+        else:
+            region.fill(0)
+        self.strokes.draw(scratch, rect)
+        self.canvas[y1:y2, x1:x2] = region
+    
+    def save_state(self):
+        """End the stroke in progress, making it one undo step."""
+        self.strokes.end()
     
     def undo(self):
         """Undo the last drawing action."""
-        if self.history_index > 0 and self.history_index < len(self.history):
-            self.history_index -= 1
-            self.canvas = self.history[self.history_index].copy()
-            return True
-        return False
+        rect = self.strokes.undo()
+        if rect is None:
+            return False
+        
+        # Redraw what was under the stroke: only the strokes that reach its bounds
+        clipped = self._clip_rect(rect)
+        before = self._count_painted(clipped)
+        self._redraw(rect)
+        self._pixels_drawn += self._count_painted(clipped) - before
+        self._mark_dirty(rect)
+        self.version += 1
+        return True
     
     def redo(self):
         """Redo the last undone action."""
-        if self.history_index < len(self.history) - 1 and self.history_index >= 0:
-            self.history_index += 1
-            self.canvas = self.history[self.history_index].copy()
-            return True
-        return False
+        index = self.strokes.redo()
+        if index is None:
+            return False
+        
+        # Everything after it is undone too, so it goes back on top as drawn
+        rect = self.strokes.get_rect(index)
+        clipped = self._clip_rect(rect)
+        before = self._count_painted(clipped)
+        self.strokes.draw_stroke(self.canvas, index)
+        self._pixels_drawn += self._count_painted(clipped) - before
+        self._mark_dirty(rect)
+        self.version += 1
+        return True
     
     def set_color(self, color):
         """Set the current drawing color."""
@@ -137,61 +249,188 @@ class CanvasManager:
         if self.last_point is None:
             self.save_state()
         
+        # Paint into the master canvas, with the brush scaled to match
+        start_point, end_point = self._to_master(start_point), self._to_master(end_point)
+        
         # Determine color and thickness based on current mode
         if self.is_erasing or self.current_mode == "erasing":
-            color = (0, 0, 0)  # Black for erasing
+            color = (0, 0, 0, 0)  # Clear coverage for erasing
             thickness = ERASER_BRUSH_SIZE
         elif self.current_mode == "selecting":
-            color = self.current_color
+            color = (*self.current_color, 255)
             thickness = SELECTION_BRUSH_SIZE
         else:  # drawing mode
-            color = self.current_color
+            color = (*self.current_color, 255)
             thickness = self.current_brush_size
+        thickness *= self.scale
         
-        # Draw line
-        cv2.line(self.canvas, start_point, end_point, color, thickness, cv2.FILLED)
+        # Area the line can touch
+        pad = thickness // 2 + 2
+        rect = (min(start_point[0], end_point[0]) - pad,
+                min(start_point[1], end_point[1]) - pad,
+                max(start_point[0], end_point[0]) + pad + 1,
+                max(start_point[1], end_point[1]) + pad + 1)
+        clipped = self._clip_rect(rect)
+        before = self._count_painted(clipped)
+        
+        # Draw line; anti-aliased edges blend all four channels, which keeps
+        # the canvas correctly premultiplied
+        line_type = cv2.LINE_AA if BRUSH_ANTIALIAS else cv2.LINE_8
+        cv2.line(self.canvas, start_point, end_point, color, thickness, line_type)
+        
+        # Record the segment, continuing the current stroke if it ends where this starts
+        if not self.strokes.continues(start_point, color, thickness):
+            self.strokes.begin(start_point, color, thickness)
+        self.strokes.extend(end_point)
+        
+        # Update statistics and remember the touched area for the overlay
+        self._pixels_drawn += self._count_painted(clipped) - before
+        self.version += 1
+        self._mark_dirty(rect)
+    
+    def compact_history(self, max_points=UNDO_FLATTEN_POINTS):
+        """Flatten some of the oldest strokes if the undo history is over budget.
+        
+        Meant to be called once a frame. Nothing is flattened while a stroke
+        is being drawn, and each call flattens strokes of about max_points
+        points in all, so an over-budget history is worked off over several
+        frames. Returns the number of strokes flattened.
+        """
+        strokes = self.strokes
+        if strokes.is_open:
+            return 0
+        starts = strokes.starts[:strokes.count]
+        n = max(strokes.count - self.max_strokes,
+                int(np.searchsorted(starts, strokes.num_points() - self.max_points)))
+        if n <= 0:
+            return 0
+        ends = starts + strokes.lengths[:strokes.count]
+        n = min(n, max(1, int(np.searchsorted(ends, max_points, side='right'))), strokes.index)
+        
+        # Drawn in order over what was under them, exactly as the canvas has them;
+        # the vectors move to the flattened strokes so drawings still save as vectors
+        if self._base is None:
+            self._base = np.zeros_like(self.canvas)
+        elif self._base is self._image:
+            self._base = self._image.copy()
+        for i in range(n):
+            strokes.draw_stroke(self._base, i)
+        self._flattened.append(strokes, n)
+        strokes.drop_oldest(n)
+        return n
+    
+    def _rebuild_base(self):
+        """Redraw the redraw cache from the loaded image and the flattened strokes."""
+        if not self._flattened.count:
+            self._base = self._image
+            return
+        self._base = self._image.copy() if self._image is not None else np.zeros_like(self.canvas)
+        self._flattened.draw(self._base)
+    
+    def _saved_strokes(self):
+        """The flattened and applied strokes together, in drawing order."""
+        if not self._flattened.count:
+            return self.strokes
+        strokes = StrokeStore(self._flattened.num_points() + self.strokes.num_points(),
+                              self._flattened.count + self.strokes.count)
+        strokes.append(self._flattened)
+        strokes.append(self.strokes)
+        return strokes
     
     def update_drawing(self, current_point):
         """Update drawing with current hand position."""
         if current_point is None:
             self.last_point = None
+            self.strokes.end()
             return
         
         if self.last_point is not None:
             self.draw_line(self.last_point, current_point)
+        else:
+            # A new stroke starts - finish the previous one
+            self.save_state()
         
         self.last_point = current_point
     
     def reset_drawing_state(self):
         """Reset the drawing state when switching modes."""
         self.last_point = None
+        self.strokes.end()
+    
+    def _update_overlay_cache(self):
+        """Refresh the compositing caches inside the dirty rects only."""
+        s = self.scale
+        for mx1, my1, mx2, my2 in self._dirty_rects:
+            # The display pixels covering the master rect, from whole master blocks;
+            # area averaging premultiplied color gives the same result as
+            # downsampling the whole master
+            x1, y1 = mx1 // s, my1 // s
+            x2, y2 = -(-mx2 // s), -(-my2 // s)
+            canvas_roi = self.canvas[y1 * s:y2 * s, x1 * s:x2 * s]
+            if s > 1:
+                canvas_roi = cv2.resize(canvas_roi, (x2 - x1, y2 - y1),
+                                        dst=self.buffers.get('canvas_view', (y2 - y1, x2 - x1, 4)),
+                                        interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(canvas_roi, cv2.COLOR_BGRA2BGR, dst=self._overlay_color[y1:y2, x1:x2])
+            alpha = cv2.extractChannel(canvas_roi, 3, dst=self.buffers.get('canvas_view_alpha',
+                                                                           (y2 - y1, x2 - x1)))
+            
+            # Grow the painted bounds by whatever is painted in this rect
+            bx, by, bw, bh = cv2.boundingRect(alpha)
+            if bw and bh:
+                painted = (x1 + bx, y1 + by, x1 + bx + bw, y1 + by + bh)
+                if self._painted_rect is None:
+                    self._painted_rect = painted
+                else:
+                    px1, py1, px2, py2 = self._painted_rect
+                    self._painted_rect = (min(px1, painted[0]), min(py1, painted[1]),
+                                          max(px2, painted[2]), max(py2, painted[3]))
+            
+            # 255 - alpha, spread to 3 channels; a broadcasting NumPy subtract
+            # would allocate a temporary buffer every call
+            cv2.bitwise_not(alpha, dst=alpha)
+            cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGR, dst=self._overlay_inv_alpha[y1:y2, x1:x2])
+        self._dirty_rects = []
     
     def get_canvas_overlay(self, frame):
         """Get the canvas overlay for the frame."""
         # Ensure canvas and frame have the same dimensions
-        if self.canvas.shape[:2] != frame.shape[:2]:
-            # Resize canvas to match frame (create a copy to avoid modifying original)
-            display_canvas = cv2.resize(self.canvas, (frame.shape[1], frame.shape[0]))
-        else:
-            display_canvas = self.canvas.copy()
-        
-        # Convert canvas to grayscale for masking
-        gray_canvas = cv2.cvtColor(display_canvas, cv2.COLOR_BGR2GRAY)
-        _, mask = cv2.threshold(gray_canvas, 1, 255, cv2.THRESH_BINARY)
+        if (self.height, self.width) != frame.shape[:2]:
+            # Resize the cached color and coverage to match the frame (premultiplied
+            # alpha resamples correctly), only when the canvas has changed
+            self._update_overlay_cache()
+            size = (frame.shape[1], frame.shape[0])
+            if self._frame_overlay_key != (size, self.version):
+                color = cv2.resize(self._overlay_color, size,
+                                   dst=self.buffers.get('overlay_color', frame.shape))
+                inv_alpha = cv2.resize(self._overlay_inv_alpha, size,
+                                       dst=self.buffers.get('overlay_inv_alpha', frame.shape))
+                self._frame_overlay = (color, inv_alpha)
+                self._frame_overlay_key = (size, self.version)
+            self._blend(frame, *self._frame_overlay)
+            return frame
         
-        # Create inverse mask
-        mask_inv = cv2.bitwise_not(mask)
+        # Blend in place, only where something may have been painted
+        self._update_overlay_cache()
+        if self._painted_rect is None:
+            return frame
         
-        # Apply masks
-        frame_bg = cv2.bitwise_and(frame, frame, mask=mask_inv)
-        canvas_fg = cv2.bitwise_and(display_canvas, display_canvas, mask=mask)
-        
-        # Combine
-        result = cv2.add(frame_bg, canvas_fg)
-        return result
+        x1, y1, x2, y2 = self._painted_rect
+        self._blend(frame[y1:y2, x1:x2], self._overlay_color[y1:y2, x1:x2],
+                    self._overlay_inv_alpha[y1:y2, x1:x2])
+        return frame
+    
+    def _blend(self, frame, color, inv_alpha):
+        """Premultiplied "over": frame = color + frame * (1 - alpha), in place."""
+        cv2.multiply(frame, inv_alpha, dst=frame, scale=1.0 / 255)
+        cv2.add(frame, color, dst=frame)
     
     def save_drawing(self, filename=None):
-        """Save the current drawing to a file."""
+        """Save the current drawing to a file.
+        
+        .npz files hold the strokes themselves and .svg files a vector image;
+        any other extension is saved as a raster image.
+        """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"drawing_{timestamp}.{DEFAULT_SAVE_FORMAT}"
@@ -199,48 +438,95 @@ class CanvasManager:
         filepath = os.path.join(SAVE_DIRECTORY, filename)
         
         try:
-            cv2.imwrite(filepath, self.canvas)
+            if filepath.endswith('.npz'):
+                self._saved_strokes().save(filepath, self.master_width, self.master_height, self._image)
+            elif filepath.endswith('.svg'):
+                with open(filepath, 'w') as f:
+                    f.write(self._saved_strokes().to_svg(self.master_width, self.master_height,
+                                                         self._image))
+            else:
+                cv2.imwrite(filepath, self.get_canvas())
             return filepath
         except Exception as e:
             print(f"Error saving drawing: {e}")
             return None
     
     def load_drawing(self, filepath):
-        """Load a drawing from a file."""
+        """Load a drawing from a file, replacing the canvas and its history."""
         try:
+            if filepath.endswith('.npz'):
+                return self._load_strokes(filepath)
+            
             loaded_canvas = cv2.imread(filepath)
             if loaded_canvas is not None:
                 # Resize if necessary
-                if loaded_canvas.shape[:2] != (self.height, self.width):
-                    loaded_canvas = cv2.resize(loaded_canvas, (self.width, self.height))
+                if loaded_canvas.shape[:2] != (self.master_height, self.master_width):
+                    loaded_canvas = cv2.resize(loaded_canvas, (self.master_width, self.master_height))
                 
-                self.canvas = loaded_canvas
-                self.save_state()
+                # Saved drawings are flat; treat non-black pixels as painted
+                gray = cv2.cvtColor(loaded_canvas, cv2.COLOR_BGR2GRAY)
+                _, alpha = cv2.threshold(gray, 1, 255, cv2.THRESH_BINARY)
+                self._image = cv2.merge((*cv2.split(cv2.bitwise_and(loaded_canvas, loaded_canvas,
+                                                                    mask=alpha)), alpha))
+                self._base = self._image
+                self.canvas = self._image.copy()
+                self.strokes.reset()
+                self._flattened.reset()
+                self._replace_canvas()
                 return True
         except Exception as e:
             print(f"Error loading drawing: {e}")
         
         return False
     
+    def _load_strokes(self, filepath):
+        """Load strokes saved as .npz, scaled to this canvas."""
+        strokes, (width, height), base = StrokeStore.load(filepath)
+        strokes.scale(self.master_width / width, self.master_height / height)
+        if base is not None and base.shape[:2] != (self.master_height, self.master_width):
+            base = cv2.resize(base, (self.master_width, self.master_height))
+        self.strokes = strokes
+        self._flattened.reset()
+        self._image = self._base = base
+        self._redraw((0, 0, self.master_width, self.master_height))
+        self._replace_canvas()
+        return True
+    
+    def _replace_canvas(self):
+        """Refresh the overlay and statistics after the whole canvas changed."""
+        self.last_point = None
+        self._mark_dirty((0, 0, self.master_width, self.master_height))
+        self._pixels_drawn = self._count_painted((0, 0, self.master_width, self.master_height))
+        self.version += 1
+    
     def get_canvas(self):
-        """Get the current canvas."""
-        return self.canvas.copy()
+        """Get the current canvas as a BGR image on black, at master resolution."""
+        # Premultiplied color is exactly the drawing composited over black
+        return cv2.cvtColor(self.canvas, cv2.COLOR_BGRA2BGR)
+    
+    def get_display_canvas(self):
+        """Get the canvas as a BGR image on black without copying, for display.
+        
+        The array is owned by the canvas and changes as it is drawn on.
+        """
+        # The overlay color cache already holds exactly that
+        self._update_overlay_cache()
+        return self._overlay_color
     
     def get_drawing_info(self):
         """Get information about the current drawing."""
-        # Count non-black pixels
-        gray = cv2.cvtColor(self.canvas, cv2.COLOR_BGR2GRAY)
-        non_zero_pixels = cv2.countNonZero(gray)
-        total_pixels = self.width * self.height
+        # Painted pixels are counted incrementally, so this is O(1)
+        non_zero_pixels = self._pixels_drawn
+        total_pixels = self.master_width * self.master_height
         
         return {
             'width': self.width,
             'height': self.height,
             'pixels_drawn': non_zero_pixels,
             'coverage_percent': (non_zero_pixels / total_pixels) * 100,
-            'history_size': len(self.history),
-            'can_undo': self.history_index > 0,
-            'can_redo': self.history_index < len(self.history) - 1,
+            'history_size': len(self.strokes),
+            'can_undo': self.strokes.can_undo(),
+            'can_redo': self.strokes.can_redo(),
             'current_mode': self.current_mode,
             'current_brush_size': self.current_brush_size,
             'is_erasing': self.is_erasing
@@ -4,11 +4,15 @@
 CAMERA_WIDTH = 800
 CAMERA_HEIGHT = 600
 CAMERA_BRIGHTNESS = 150
+FRAME_SOURCE = "camera:0"  # camera[:index], video:path, images:directory, synthetic[:frames] or shm:name
+THREADED_CAPTURE = True  # Grab frames on a background thread, always using the newest
+CAPTURE_TIMEOUT = 1.0  # Seconds to wait for a new frame before reusing the last one
 
 # Canvas settings
 CANVAS_WIDTH = 800
 CANVAS_HEIGHT = 600
 CANVAS_BACKGROUND = (0, 0, 0)  # Black background
+MASTER_CANVAS_SIZE = 3840  # Long side of the print-resolution canvas strokes are painted into (0: display size)
 
 # UI settings
 HEADER_HEIGHT = 80
@@ -21,12 +25,20 @@ DEFAULT_BRUSH_SIZE = 25
 DEFAULT_ERASER_SIZE = 100
 DEFAULT_SELECTION_SIZE = 15
 BRUSH_SIZES = [5, 10, 15, 25, 35, 50, 75, 100]
+BRUSH_ANTIALIAS = True  # Soft, anti-aliased brush edges
 
 # Mode-specific brush sizes
 DRAWING_BRUSH_SIZE = 25
 ERASER_BRUSH_SIZE = 100
 SELECTION_BRUSH_SIZE = 15
 
+# Undo/redo settings: strokes past these budgets are flattened, oldest first,
+# into the raster under the rest and can no longer be undone (their vectors
+# are still saved). Flattening happens between strokes, a little per frame
+UNDO_MAX_STROKES = 500
+UNDO_MAX_POINTS = 200000  # Undoable stroke points, 8 bytes each
+UNDO_FLATTEN_POINTS = 100  # Stroke points flattened per frame, past the first stroke
+
 # Gesture settings
 SELECTION_DELAY = 15  # Frames to wait before allowing new selection
 DRAWING_THRESHOLD = 80  # Y-coordinate threshold for drawing mode
@@ -51,12 +63,48 @@ COLORS = [
 HAND_DETECTION_CONFIDENCE = 0.7
 HAND_TRACKING_CONFIDENCE = 0.5
 MAX_NUM_HANDS = 2
+INFERENCE_SCALE = 1.0  # Downscale frames before inference, e.g. 0.5 for 1080p cameras
+ROI_TRACKING = False  # Infer only around where the hands were last frame
+ROI_MARGIN = 0.25  # Extra space around the hands' bounding box, per side, as a fraction of its size
+ROI_VELOCITY_GAIN = 1.5  # How much last frame's motion grows the region
+ROI_MIN_SIZE = 0.25  # Smallest region, as a fraction of the shorter frame side
+ROI_REDETECT_INTERVAL = 30  # Frames between full-frame passes that catch new hands
+INFERENCE_INTERVAL = 1  # Run inference every Nth frame; 0 adapts to inference cost
+INFERENCE_TIME_BUDGET = 0.015  # Adaptive mode: inference seconds allowed per displayed frame
+INFERENCE_MAX_INTERVAL = 4  # Adaptive mode: most frames between inferences
+PREDICTION_VELOCITY_GAIN = 0.6  # How quickly predicted motion follows new detections
+PREDICTION_MAX_FRAMES = 8  # Drop predicted hands after this many frames without a detection
+MOTION_GATE = True  # Skip hand inference while the scene is static and no hand is in view
+MOTION_GATE_WIDTH = 80  # Width frames are downsampled to for differencing
+MOTION_GATE_PIXEL_THRESHOLD = 20  # Gray level change that counts a pixel as moving
+MOTION_GATE_MIN_AREA = 0.002  # Fraction of moving pixels that counts as motion
+MOTION_GATE_HOLD_FRAMES = 30  # Still frames without a hand before inference idles
+INFERENCE_IN_PROCESS = False  # Run MediaPipe in a worker process, one frame behind the display
+INFERENCE_RING_SLOTS = 3  # Shared-memory frame slots for the inference worker
 
 # File settings
 SAVE_DIRECTORY = "saved_drawings"
-DEFAULT_SAVE_FORMAT = "png"
+DEFAULT_SAVE_FORMAT = "png"  # Or "npz" for the strokes themselves, "svg" for a vector image
+OUTPUT_FOURCC = "mp4v"  # Codec of videos rendered with --output
+OUTPUT_QUEUE_SIZE = 8  # Frames buffered ahead of the background video encoder
+SESSION_FRAME_FORMAT = ".jpg"  # Encoding of recorded session frames; ".png" is lossless but larger
+SESSION_JPEG_QUALITY = 90
+SESSION_FRAME_SCALE = 1.0  # Record frames downscaled, e.g. 0.5; replay scales them back up
+SESSION_QUEUE_SIZE = 8  # Frames buffered ahead of the background session writer
 
 # Performance settings
-TARGET_FPS = 30
+PERFORMANCE_PROFILE = "interactive"  # "performance" drops visual extras for headless/kiosk runs
+TARGET_FPS = 30  # 0 runs uncapped, for benchmarking
+DRAW_HAND_SKELETON = PERFORMANCE_PROFILE != "performance"  # Render the tracked hand skeleton
+# Show windows and poll keys on a display thread, off the processing loop. None
+# enables it only with HighGUI backends that allow it (GTK, Win32): Cocoa on
+# macOS and Qt must be driven from the main thread
+THREADED_DISPLAY = None
+DISPLAY_QUEUE_SIZE = 2  # Finished frames waiting for display; the oldest is dropped when full
+CANVAS_DISPLAY_FPS = 5  # Refresh rate of the Canvas window, which only redraws when the canvas changes
+LATENCY_TRACKING = True  # Time each main loop stage (toggle the panel with 'P')
+LATENCY_WINDOW = 300  # Frames the latency percentiles are computed over
+LATENCY_EXPORT_PATH = ""  # Metrics file written periodically: .prom for Prometheus text, else CSV
+LATENCY_EXPORT_INTERVAL = 10.0  # Seconds between metrics exports
 SHOW_FPS = True
 SHOW_MODE_TEXT = True 
\ No newline at end of file
@@ -0,0 +1,117 @@
+import threading
+import time
+import numpy as np
+from config import *
+
+class FrameGrabber:
+    def __init__(self, cap, timeout=CAPTURE_TIMEOUT):
+        """Initialize a background grabber around an opened capture device."""
+        self.cap = cap
+        self.timeout = timeout
+
+        # Latest-frame slot shared with the capture thread. Frames rotate through
+        # three buffers: one being captured into, the newest, and the caller's
+        self._cond = threading.Condition()
+        self._frame = None
+        self._in_use = None
+        self._spare = []
+        self._frame_id = 0
+        self._last_read_id = 0
+        self._thread = None
+        self.running = False
+
+        # Statistics
+        self.frames_captured = 0
+        self.frames_dropped = 0     # Captured but replaced before being read
+        self.frames_duplicated = 0  # Handed out again because nothing newer arrived
+
+    def start(self):
+        """Start the capture thread."""
+        if self._thread is None:
+            self.running = True
+            self._thread = threading.Thread(target=self._capture_loop,
+                                            name="FrameGrabber", daemon=True)
+            self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        """Read frames as fast as the device delivers them, keeping only the newest."""
+        while self.running:
+            with self._cond:
+                if self._spare:
+                    buffer = self._spare.pop()
+                elif self._frame is not None:
+                    buffer = np.empty_like(self._frame)  # Until all three buffers exist
+                else:
+                    buffer = None
+            success, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+            with self._cond:
+                if not success:
+                    self.running = False
+                    self._cond.notify_all()
+                    break
+
+                # The previous frame was never consumed - it is dropped
+                if self._frame_id > self._last_read_id:
+                    self.frames_dropped += 1
+
+                # Recycle the replaced frame unless the caller is still using it
+                if self._frame is not None and self._frame is not self._in_use:
+                    self._spare.append(self._frame)
+                self._frame = frame
+                self._frame_id += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
+
+    def read(self, wait=True):
+        """Return the newest frame as (success, frame), like cv2.VideoCapture.read.
+
+        The frame stays valid until the next call. Until the first frame
+        arrives this waits as long as the capture thread runs, since cameras
+        can take seconds to start; after that it waits at most the timeout
+        and hands out the last frame again.
+        """
+        with self._cond:
+            while wait and self._frame is None and self.running:
+                self._cond.wait()
+
+            if wait and self._frame_id == self._last_read_id and self.running:
+                deadline = time.monotonic() + self.timeout
+                while self._frame_id == self._last_read_id and self.running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            if self._frame is None:
+                return False, None
+
+            if self._frame_id == self._last_read_id:
+                # Nothing newer than what the caller already has
+                if not self.running:
+                    return False, None
+                self.frames_duplicated += 1
+
+            self._last_read_id = self._frame_id
+            if self._in_use is not None and self._in_use is not self._frame:
+                self._spare.append(self._in_use)
+            self._in_use = self._frame
+            return True, self._frame
+
+    def get_stats(self):
+        """Get capture statistics."""
+        with self._cond:
+            return {
+                'frames_captured': self.frames_captured,
+                'frames_dropped': self.frames_dropped,
+                'frames_duplicated': self.frames_duplicated
+            }
+
+    def stop(self):
+        """Stop the capture thread."""
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from config import *
+from session_recorder import NO_KEY
+
+def highgui_supports_threads():
+    """Check whether HighGUI windows can be driven from a thread other than the main one.
+
+    The GTK and Win32 backends work from any one thread; Cocoa (macOS) and Qt
+    need the main thread.
+    """
+    framework = cv2.currentUIFramework() if hasattr(cv2, 'currentUIFramework') else ''
+    return framework.startswith('GTK') or framework == 'WIN32'
+
+class FrameDisplay:
+    def __init__(self, window_name='Virtual Painter', canvas_window='Canvas', threaded=THREADED_DISPLAY,
+                 queue_size=DISPLAY_QUEUE_SIZE, canvas_fps=CANVAS_DISPLAY_FPS):
+        """Initialize the presentation stage for the main and Canvas windows.
+
+        Finished frames are copied into a small set of reused slots and handed
+        to a display thread over a bounded queue, so slow window-system calls
+        never hold up processing. When the display falls behind, the oldest
+        waiting frame is dropped, so the newest is always shown next. The
+        Canvas window is refreshed at most canvas_fps times a second, and only
+        when the canvas has changed.
+
+        threaded=None uses the display thread only where the HighGUI backend
+        allows it; elsewhere frames are shown on the calling thread.
+        """
+        self.window_name = window_name
+        self.canvas_window = canvas_window
+        self.threaded = highgui_supports_threads() if threaded is None else threaded
+        self.canvas_interval = 1.0 / canvas_fps if canvas_fps > 0 else 0.0
+
+        # Slots are either free, queued or on screen (two while the display swaps them),
+        # so there is always a free one when the queue has room
+        self._queue = queue.Queue(queue_size)
+        self._frames = [None] * (queue_size + 2)
+        self._canvases = [None] * (queue_size + 2)
+        self._free_frames = queue.SimpleQueue()
+        self._free_canvases = queue.SimpleQueue()
+        for slot in range(queue_size + 2):
+            self._free_frames.put(slot)
+            self._free_canvases.put(slot)
+        self._keys = queue.SimpleQueue()
+        self._thread = None
+        self.running = False
+
+        self._canvas_version = None
+        self._last_canvas_time = 0.0
+
+        # Statistics
+        self.frames_shown = 0
+        self.frames_dropped = 0  # Replaced by a newer frame before being shown
+        self.canvas_updates = 0
+
+    def start(self):
+        """Start the display thread, if displaying in the background."""
+        if self.threaded and self._thread is None:
+            self.running = True
+            self._thread = threading.Thread(target=self._display_loop, name="FrameDisplay", daemon=True)
+            self._thread.start()
+        return self
+
+    def canvas_due(self, version):
+        """Check whether the Canvas window should be refreshed with this canvas version."""
+        return (version != self._canvas_version and
+                time.perf_counter() - self._last_canvas_time >= self.canvas_interval)
+
+    def show(self, frame, canvas=None, version=None):
+        """Hand a finished frame, and optionally a new canvas view, to the display.
+
+        Both are copied, so the caller may reuse its buffers straight away.
+        """
+        if not self.threaded:
+            cv2.imshow(self.window_name, frame)
+            if canvas is not None:
+                cv2.imshow(self.canvas_window, canvas)
+                self._canvas_shown(version)
+            self._poll_key()
+            self.frames_shown += 1
+            return
+
+        # Only this thread adds to the queue, so once the oldest frame is
+        # evicted there is room, and a free slot, for this one
+        stale_canvas = None
+        if self._queue.full():
+            try:
+                stale_slot, stale_canvas = self._queue.get_nowait()
+                self._free_frames.put(stale_slot)
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass  # The display thread took it meanwhile
+        slot = self._free_frames.get_nowait()
+        self._frames[slot] = _copy_into(self._frames[slot], frame)
+
+        canvas_slot = stale_canvas  # Still the newest canvas unless a new one comes
+        if canvas is not None:
+            if stale_canvas is not None:
+                self._free_canvases.put(stale_canvas)
+            canvas_slot = self._free_canvases.get_nowait()
+            self._canvases[canvas_slot] = _copy_into(self._canvases[canvas_slot], canvas)
+            self._canvas_shown(version)
+
+        self._queue.put_nowait((slot, canvas_slot))
+
+    def _canvas_shown(self, version):
+        self._canvas_version = version
+        self._last_canvas_time = time.perf_counter()
+        self.canvas_updates += 1
+
+    def _display_loop(self):
+        """Show queued frames and poll the keyboard until stopped."""
+        shown_frame = shown_canvas = None
+        while self.running:
+            try:
+                slot, canvas_slot = self._queue.get(timeout=0.01)
+            except queue.Empty:
+                self._poll_key()  # Keep the windows responsive while idle
+                continue
+
+            cv2.imshow(self.window_name, self._frames[slot])
+            if shown_frame is not None:
+                self._free_frames.put(shown_frame)
+            shown_frame = slot
+            if canvas_slot is not None:
+                cv2.imshow(self.canvas_window, self._canvases[canvas_slot])
+                if shown_canvas is not None:
+                    self._free_canvases.put(shown_canvas)
+                shown_canvas = canvas_slot
+            self._poll_key()
+            self.frames_shown += 1
+
+        cv2.destroyAllWindows()
+
+    def _poll_key(self):
+        key = cv2.waitKey(1) & 0xFF
+        if key != NO_KEY:
+            self._keys.put(key)
+
+    def get_key(self):
+        """Get the oldest key pressed since the last call, or NO_KEY."""
+        try:
+            return self._keys.get_nowait()
+        except queue.Empty:
+            return NO_KEY
+
+    def get_stats(self):
+        """Get display statistics."""
+        return {
+            'frames_shown': self.frames_shown,
+            'frames_dropped': self.frames_dropped,
+            'canvas_updates': self.canvas_updates
+        }
+
+    def stop(self):
+        """Stop the display thread and close the windows."""
+        if self._thread is not None:
+            self.running = False
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        else:
+            cv2.destroyAllWindows()
+
+def _copy_into(buffer, image):
+    """Copy image into buffer, reallocating it if the shape has changed."""
+    if buffer is None or buffer.shape != image.shape or buffer.dtype != image.dtype:
+        return image.copy()
+    np.copyto(buffer, image)
+    return buffer
@@ -0,0 +1,53 @@
+import time
+from config import *
+
+class FramePacer:
+    def __init__(self, target_fps=TARGET_FPS):
+        """Initialize the pacer; a target of 0 or less runs uncapped."""
+        self.uncapped = target_fps <= 0
+        self.period = 0.0 if self.uncapped else 1.0 / target_fps
+        self.next_deadline = None
+
+        # Statistics
+        self.frames = 0
+        self.missed_deadlines = 0
+        self.total_sleep = 0.0
+
+    def reset(self):
+        """Start pacing again from the current time."""
+        self.next_deadline = None
+
+    def wait(self):
+        """Sleep only for what is left of the current frame period.
+
+        Returns False if the frame overran its deadline.
+        """
+        self.frames += 1
+        if self.uncapped:
+            return True
+
+        now = time.perf_counter()
+        if self.next_deadline is None:
+            self.next_deadline = now + self.period
+            return True
+
+        remaining = self.next_deadline - now
+        if remaining > 0:
+            time.sleep(remaining)
+            self.total_sleep += remaining
+            self.next_deadline += self.period
+            return True
+
+        # Missed - schedule from now rather than bursting to catch up
+        self.missed_deadlines += 1
+        self.next_deadline = now + self.period
+        return False
+
+    def get_stats(self):
+        """Get pacing statistics."""
+        return {
+            'frames': self.frames,
+            'missed_deadlines': self.missed_deadlines,
+            'total_sleep': self.total_sleep,
+            'uncapped': self.uncapped
+        }
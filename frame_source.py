@@ -0,0 +1,223 @@
+import os
+import time
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+from config import *
+from inference_worker import SharedFrameRing, RING_COUNT
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+class FrameSource(ABC):
+    def __init__(self):
+        """Initialize the shared state of a frame source.
+
+        Sources decode into a buffer that is allocated once and reused, so a
+        frame stays valid only until the next read into the same buffer.
+        """
+        self.frame = None  # Own buffer, allocated by the first read
+        self.frames_read = 0
+        self.fps = None  # Nominal frame rate, if the source has one
+
+    def read(self, frame=None):
+        """Get the next frame as (success, frame), like cv2.VideoCapture.read().
+
+        The frame is decoded into the given buffer, or the source's own one.
+        """
+        own_buffer = frame is None
+        success, frame = self._read_into(self.frame if own_buffer else frame)
+        if not success:
+            return False, None
+
+        if own_buffer:
+            self.frame = frame
+        self.frames_read += 1
+        return True, frame
+
+    @abstractmethod
+    def _read_into(self, frame):
+        """Decode the next frame into frame (reallocating if it is None or the wrong shape)."""
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        """Release the underlying device or file."""
+        pass
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0, width=CAMERA_WIDTH, height=CAMERA_HEIGHT,
+                 brightness=CAMERA_BRIGHTNESS):
+        """Open a camera and set its capture properties."""
+        super().__init__()
+        self.cap = cv2.VideoCapture(index)
+        if not self.cap.isOpened():
+            raise OSError(f"Could not open camera {index}")
+
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BRIGHTNESS, brightness)
+
+    def _read_into(self, frame):
+        return self.cap.read(frame) if frame is not None else self.cap.read()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, loop=False):
+        """Open a video file, optionally restarting it when it ends."""
+        super().__init__()
+        if not os.path.isfile(path):
+            raise OSError(f"Video file not found: {path}")
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise OSError(f"Could not open video file: {path}")
+        self.path = path
+        self.loop = loop
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+
+    def _read_into(self, frame):
+        success, out = self.cap.read(frame) if frame is not None else self.cap.read()
+        if not success and self.loop and self.frames_read > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, out = self.cap.read(frame) if frame is not None else self.cap.read()
+        return success, out
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, directory, loop=False):
+        """Read the images in a directory in name order, optionally over and over."""
+        super().__init__()
+        if not os.path.isdir(directory):
+            raise OSError(f"Image directory not found: {directory}")
+        self.paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                      if name.lower().endswith(IMAGE_EXTENSIONS)]
+        if not self.paths:
+            raise OSError(f"No images found in {directory}")
+        self.loop = loop
+        self.index = 0
+
+    def _read_into(self, frame):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                return False, None
+            self.index = 0
+
+        path = self.paths[self.index]
+        self.index += 1
+        image = _imread_into(path, frame)
+        if image is None:
+            print(f"Error reading image: {path}")
+            return False, None
+        return True, image
+
+class SyntheticSource(FrameSource):
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, num_frames=None, seed=0):
+        """Generate a repeatable moving test pattern, forever or for num_frames frames."""
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.num_frames = num_frames
+
+        # A fixed noisy gradient background, with a bright blob moving over it
+        rng = np.random.default_rng(seed)
+        gradient = np.linspace(40, 200, width, dtype=np.float32)
+        background = np.empty((height, width, 3), np.float32)
+        background[...] = gradient[None, :, None]
+        background += rng.normal(0, 8, background.shape)
+        self.background = np.clip(background, 0, 255).astype(np.uint8)
+        self.phase = rng.uniform(0, 2 * np.pi)
+
+    def _read_into(self, frame):
+        if self.num_frames is not None and self.frames_read >= self.num_frames:
+            return False, None
+        if frame is None or frame.shape != self.background.shape:
+            frame = np.empty_like(self.background)
+
+        np.copyto(frame, self.background)
+        t = self.phase + self.frames_read * 0.05
+        center = (int(self.width * (0.5 + 0.35 * np.cos(t))),
+                  int(self.height * (0.5 + 0.35 * np.sin(2 * t))))
+        cv2.circle(frame, center, max(8, self.height // 12), (230, 210, 190), cv2.FILLED)
+        return True, frame
+
+class SharedMemorySource(FrameSource):
+    def __init__(self, name, num_slots=None, max_shape=None, timeout=CAPTURE_TIMEOUT):
+        """Attach to a SharedFrameRing that another process publishes frames into.
+
+        The ring's layout is read from its header; num_slots and max_shape,
+        if given, must match it.
+        """
+        super().__init__()
+        self.ring = SharedFrameRing(num_slots, max_shape, name=name)
+        self.timeout = timeout
+        self.last_count = 0
+        self.frames_skipped = 0  # Published but overtaken by newer frames before being read
+
+    def _read_into(self, frame):
+        # Wait for a frame newer than the last one read
+        deadline = time.monotonic() + self.timeout
+        count, view = self.ring.latest()
+        while count == self.last_count:
+            if time.monotonic() > deadline:
+                return False, None
+            time.sleep(0.001)
+            count, view = self.ring.latest()
+
+        if frame is None or frame.shape != view.shape:
+            frame = np.empty(view.shape, np.uint8)
+        np.copyto(frame, view)
+        while int(self.ring.header[RING_COUNT]) >= count + self.ring.num_slots - 1:
+            # The writer lapped the ring while we copied - take the newest frame instead
+            count, view = self.ring.latest()
+            np.copyto(frame, view)
+
+        if self.last_count:
+            self.frames_skipped += count - self.last_count - 1
+        self.last_count = count
+        return True, frame
+
+    def release(self):
+        self.ring.close()
+
+def _imread_into(path, frame):
+    """Decode an image file, into frame when it has the image's shape."""
+    if frame is not None:
+        try:
+            # Newer OpenCV builds load straight into a matching buffer
+            return cv2.imread(path, dst=frame)
+        except TypeError:
+            pass
+    image = cv2.imread(path)
+    if image is not None and frame is not None and frame.shape == image.shape:
+        np.copyto(frame, image)
+        return frame
+    return image
+
+def open_frame_source(spec=FRAME_SOURCE, loop=False):
+    """Open a frame source from a "kind[:argument]" spec.
+
+    Kinds are camera[:index], video:path, images:directory, synthetic[:frames]
+    and shm:name.
+    """
+    kind, _, argument = spec.partition(':')
+    if kind == 'camera':
+        return CameraSource(int(argument or 0))
+    if kind == 'video':
+        return VideoFileSource(argument, loop)
+    if kind == 'images':
+        return ImageDirectorySource(argument, loop)
+    if kind == 'synthetic':
+        return SyntheticSource(num_frames=int(argument) if argument else None)
+    if kind == 'shm':
+        return SharedMemorySource(argument)
+    raise ValueError(f"Unknown frame source: {spec}")
@@ -1,146 +1,477 @@
-
+from collections import deque
+import time
 import cv2
 import mediapipe as mp
 import numpy as np
 from config import *
+from inference_worker import InferenceWorker
+from landmark_predictor import LandmarkPredictor
+from motion_gate import MotionGate
+from buffer_pool import BufferPool
+from latency_monitor import LatencyMonitor
+
+# Gesture labels
+GESTURE_SELECTION = "selection"    # Index and middle up, ring and pinky down
+GESTURE_DRAWING = "drawing"        # Only index up
+GESTURE_ERASER = "eraser"          # Fist - all fingers down
+GESTURE_ERASER_ALT = "eraser_alt"  # Thumb and index down, others up
+
+# Landmark IDs of the index to pinky fingers, as slices so lookups are views
+FINGER_TIPS = slice(8, 21, 4)  # Tips 8, 12, 16, 20
+FINGER_JOINTS = slice(6, 19, 4)  # Joints 6, 10, 14, 18, each compared with its tip
+
+# Finger patterns of each gesture, first match wins; -1 = don't care
+GESTURE_LABELS = [GESTURE_SELECTION, GESTURE_DRAWING, GESTURE_ERASER, GESTURE_ERASER_ALT]
+GESTURE_PATTERNS = np.array([
+    [-1, 1, 1, 0, 0],
+    [-1, 1, 0, 0, 0],
+    [0, 0, 0, 0, 0],
+    [0, 0, 1, 1, 1],
+], np.int8)
+
+class HandResult:
+    """Gesture state of one hand, computed once per frame."""
+    __slots__ = ('landmarks', 'fingers', 'gesture', 'index_tip', 'middle_tip')
+    
+    def __init__(self, landmarks, fingers, gesture):
+        self.landmarks = landmarks  # (21, 3) float32: pixel x, pixel y, relative depth z
+        self.fingers = fingers      # [thumb, index, middle, ring, pinky], 1 if up
+        self.gesture = gesture      # One of the GESTURE_* labels, or None
+        self.index_tip = (int(landmarks[8, 0]), int(landmarks[8, 1]))
+        self.middle_tip = (int(landmarks[12, 0]), int(landmarks[12, 1]))
 
 class HandTracker:
-    def __init__(self):
+    def __init__(self, use_process=INFERENCE_IN_PROCESS, inference_scale=INFERENCE_SCALE,
+                 roi_tracking=ROI_TRACKING, inference_interval=INFERENCE_INTERVAL,
+                 motion_gate=MOTION_GATE, buffers=None, latency=None):
         """Initialize the hand tracker with MediaPipe."""
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=MAX_NUM_HANDS,
-            min_detection_confidence=HAND_DETECTION_CONFIDENCE,
-            min_tracking_confidence=HAND_TRACKING_CONFIDENCE
-        )
-        self.mp_draw = mp.solutions.drawing_utils
-        self.landmarks = []
-        
-    def process_frame(self, frame):
-        """Process a frame and extract hand landmarks."""
+        
+        # Stage timing, shared with the main loop when it measures latency
+        self.latency = latency if latency is not None else LatencyMonitor(enabled=False)
+        
+        # Scratch frames for flipping and inference input, reused every frame
+        self.buffers = buffers if buffers is not None else BufferPool()
+        self.skeleton_connections = np.array(sorted(self.mp_hands.HAND_CONNECTIONS), np.intp)
+        self._skeleton_hands = 0  # Hands the skeleton segment buffers have room for
+        
+        # Per-frame results: landmarks of all hands as one (hands, 21, 3) array,
+        # and one HandResult per hand
+        self.landmarks = np.empty((0, 21, 3), np.float32)
+        self.hand_results = []
+        
+        # Fraction of the camera resolution MediaPipe sees
+        self.inference_scale = inference_scale
+        
+        # Region-of-interest tracking around the previous frame's hands
+        self.roi_tracking = roi_tracking
+        self._roi_center = None
+        self._roi_velocity = (0.0, 0.0)
+        self._frames_since_full = 0
+        self.roi_hits = 0
+        self.roi_misses = 0
+        
+        # Inference every Nth frame (0 adapts to inference cost), with landmarks
+        # predicted from the hands' motion in between
+        self.inference_interval = inference_interval
+        self.predictor = LandmarkPredictor()
+        self.frame_index = 0
+        self._last_inference_frame = None
+        self._inference_time = None  # Smoothed seconds per inference
+        self.inference_count = 0
+        
+        # Idle inference while nothing moves and no hand is in view
+        self.motion_gate = MotionGate() if motion_gate else None
+        self.gated = False
+        
+        # Inference either runs here or in a worker process (started on the first frame)
+        self.use_process = use_process
+        self.worker = None
+        self._pending_crops = deque()
+        self.hands = None
+        if not use_process:
+            self.hands = self.mp_hands.Hands(
+                static_image_mode=False,
+                max_num_hands=MAX_NUM_HANDS,
+                min_detection_confidence=HAND_DETECTION_CONFIDENCE,
+                min_tracking_confidence=HAND_TRACKING_CONFIDENCE
+            )
+    
+    def process_frame(self, frame, landmarks=None):
+        """Process a frame and extract hand landmarks.
+        
+        Given landmarks (pixel coordinates in the mirrored frame, e.g. from a
+        recorded session) are used as-is instead of running inference.
+        """
+        self.frame_index += 1
+        
+        if landmarks is not None:
+            self._store_landmarks(np.array(landmarks, np.float32).reshape(-1, 21, 3))
+            self.latency.lap('classification')
+            return self._flip(frame)
+        
+        if self.motion_gate is not None:
+            self.gated = not self.motion_gate.update(frame, len(self.landmarks) > 0)
+            self.latency.lap('motion_gate')
+            if self.gated:
+                # Static scene - there are no landmarks to update or draw
+                return self._flip(frame)
+        
+        result = None
+        if self._should_infer():
+            start = time.perf_counter()
+            result = self._detect(frame)
+            elapsed = time.perf_counter() - start
+            self._inference_time = (elapsed if self._inference_time is None
+                                    else 0.9 * self._inference_time + 0.1 * elapsed)
+            self._last_inference_frame = self.frame_index
+            self.inference_count += 1
+        elif self.worker is not None and self.worker.poll():
+            # A result finished in the background between inference frames
+            hands, _, detected_frame = self._collect_async()
+            result = (hands, detected_frame)
+            self.latency.lap('inference')
+        
+        if result is not None:
+            hands, detected_frame = result
+            self.predictor.update(hands, detected_frame)
+        
         # Flip frame horizontally for mirror effect
-        frame = cv2.flip(frame, 1)
+        frame = self._flip(frame)
+        
+        # Detections pass through unchanged; other frames get predicted landmarks
+        self._set_landmarks(self.predictor.predict(self.frame_index), frame.shape)
+        self._update_roi_motion()
+        self.latency.lap('classification')
+        
+        return frame
+    
+    def _flip(self, frame):
+        """Mirror the frame into the reused display buffer, which is returned."""
+        frame = cv2.flip(frame, 1, dst=self.buffers.get('display', frame.shape))
+        self.latency.lap('flip')
+        return frame
+    
+    def _should_infer(self):
+        """Decide whether this frame gets a MediaPipe pass."""
+        if self._last_inference_frame is None:
+            return True
         
+        interval = self.inference_interval
+        if interval <= 0:
+            # Adaptive: skip enough frames to keep inference within its budget
+            if self._inference_time is None:
+                interval = 1
+            else:
+                interval = int(np.ceil(self._inference_time / INFERENCE_TIME_BUDGET))
+                interval = min(max(interval, 1), INFERENCE_MAX_INTERVAL)
+        return self.frame_index - self._last_inference_frame >= interval
+    
+    def _detect(self, frame):
+        """Run inference, in the ROI if tracking, and return (hands, frame index) or None."""
+        h, w = frame.shape[:2]
+        roi = self._next_roi(w, h)
+        result = self._run_inference(frame, roi)
+        if result is None:
+            return None
+        
+        hands, from_roi, detected_frame = result
+        if from_roi:
+            if len(hands):
+                self.roi_hits += 1
+            else:
+                # Tracking lost - fall back to full-frame detection
+                self.roi_misses += 1
+                if not self.use_process:
+                    hands, _, detected_frame = self._run_inference(frame, None)
+        
+        return hands, detected_frame
+    
+    def _next_roi(self, width, height):
+        """Pick the display-space region (x1, y1, x2, y2) to infer on, or None for the full frame."""
+        if not self.roi_tracking or len(self.landmarks) == 0:
+            return None
+        if self._frames_since_full >= ROI_REDETECT_INTERVAL:
+            return None  # Look for hands that entered outside the region
+        
+        # Previous hands' bounding box, grown by the margin and by how far they
+        # moved last frame, and shifted to where they are heading
+        x1, y1 = self.landmarks[..., 0].min(), self.landmarks[..., 1].min()
+        x2, y2 = self.landmarks[..., 0].max(), self.landmarks[..., 1].max()
+        vx, vy = self._roi_velocity
+        size = max(x2 - x1, y2 - y1) * (1 + 2 * ROI_MARGIN)
+        size = max(size, ROI_MIN_SIZE * min(width, height))
+        half_w = size / 2 + abs(vx) * ROI_VELOCITY_GAIN
+        half_h = size / 2 + abs(vy) * ROI_VELOCITY_GAIN
+        cx, cy = (x1 + x2) / 2 + vx, (y1 + y2) / 2 + vy
+        
+        rx1, ry1 = int(max(cx - half_w, 0)), int(max(cy - half_h, 0))
+        rx2, ry2 = int(min(cx + half_w, width)), int(min(cy + half_h, height))
+        if rx2 <= rx1 or ry2 <= ry1:
+            return None
+        if (rx2 - rx1) * (ry2 - ry1) > 0.6 * width * height:
+            return None  # Barely smaller than the frame - not worth cropping
+        return (rx1, ry1, rx2, ry2)
+    
+    def _update_roi_motion(self):
+        """Track how far the hands' center moved since the last frame."""
+        if len(self.landmarks) == 0:
+            self._roi_center = None
+            self._roi_velocity = (0.0, 0.0)
+            return
+        
+        center = (float(self.landmarks[..., 0].mean()), float(self.landmarks[..., 1].mean()))
+        if self._roi_center is not None:
+            vx, vy = self._roi_velocity
+            # Smooth to keep the region from jittering
+            self._roi_velocity = (0.5 * vx + 0.5 * (center[0] - self._roi_center[0]),
+                                  0.5 * vy + 0.5 * (center[1] - self._roi_center[1]))
+        self._roi_center = center
+    
+    def _run_inference(self, frame, roi):
+        """Infer on the frame, or a display-space region of it.
+        
+        Returns landmarks normalized to the mirrored display frame, whether they
+        came from a region rather than the full frame, and the index of the frame
+        they were detected in - or None if no result is available yet.
+        """
+        h, w = frame.shape[:2]
+        if roi is None:
+            crop = (0, 0, w, h)
+            self._frames_since_full = 0
+        else:
+            # The display is mirrored, so the region comes from the other side
+            x1, y1, x2, y2 = roi
+            crop = (w - x2, y1, w - x1, y2)
+            self._frames_since_full += 1
+        
+        cx1, cy1, cx2, cy2 = crop
+        small = self._prepare_inference_input(frame[cy1:cy2, cx1:cx2])
+        self.latency.lap('preprocess')
+        if self.use_process:
+            result = self._infer_async(small, crop, (w, h))
+            self.latency.lap('inference')
+            return result
+        return self._map_landmarks(self._infer(small), crop, (w, h)) + (self.frame_index,)
+    
+    def _map_landmarks(self, hands, crop, size):
+        """Map crop-normalized landmarks to the whole mirrored frame."""
+        w, h = size
+        cx1, cy1, cx2, cy2 = crop
+        hands[..., 0] = 1.0 - (cx1 + hands[..., 0] * (cx2 - cx1)) / w
+        hands[..., 1] = (cy1 + hands[..., 1] * (cy2 - cy1)) / h
+        return hands, crop != (0, 0, w, h)
+    
+    def _prepare_inference_input(self, frame):
+        """Downscale a BGR frame by the inference scale."""
+        if self.inference_scale >= 1.0:
+            return frame
+        h, w = frame.shape[:2]
+        size = (max(1, round(w * self.inference_scale)), max(1, round(h * self.inference_scale)))
+        small = self.buffers.get('inference_input', (size[1], size[0]) + frame.shape[2:])
+        return cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+    
+    def _infer(self, frame):
+        """Run MediaPipe on a BGR frame and return normalized (hands, 21, 3) landmarks."""
         # Convert to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB,
+                                 dst=self.buffers.get('inference_rgb', frame.shape))
+        self.latency.lap('preprocess')
         results = self.hands.process(rgb_frame)
         
-        self.landmarks = []
-        
+        hands = []
         if results.multi_hand_landmarks:
             for hand_landmarks in results.multi_hand_landmarks:
-                # Draw hand landmarks
-                self.mp_draw.draw_landmarks(
-                    frame, 
-                    hand_landmarks, 
-                    self.mp_hands.HAND_CONNECTIONS
-                )
-                
-                # Extract landmark coordinates
-                landmarks = []
-                for id, lm in enumerate(hand_landmarks.landmark):
-                    h, w, c = frame.shape
-                    cx, cy = int(lm.x * w), int(lm.y * h)
-                    landmarks.append([id, cx, cy])
-                
-                self.landmarks.append(landmarks)
+                hands.append([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark])
         
-        return frame
+        landmarks = np.array(hands, np.float32).reshape(-1, 21, 3)
+        self.latency.lap('inference')
+        return landmarks
     
-    def get_finger_state(self, landmarks):
-        """Determine which fingers are up based on landmark positions."""
-        if not landmarks:
-            return []
-            
-        tips = [4, 8, 12, 16, 20]  # Finger tip landmark IDs
-        fingers = []
+    def _infer_async(self, frame, crop, size):
+        """Submit this frame to the worker and pick up an earlier frame's landmarks."""
+        if self.worker is None:
+            self.worker = InferenceWorker(frame.shape)
         
+        # Frame N+1 is inferred while frame N is composited and displayed
+        self.worker.submit(frame)
+        self._pending_crops.append((crop, size, self.frame_index))
+        if len(self.worker.pending) > 1:
+            hands, from_roi, detected_frame = self._collect_async()
+            return hands, from_roi, detected_frame
+        return None
+    
+    def _collect_async(self):
+        """Collect the oldest result from the worker, mapped to the display."""
+        crop, size, detected_frame = self._pending_crops.popleft()
+        hands, from_roi = self._map_landmarks(self.worker.collect(), crop, size)
+        return hands, from_roi, detected_frame
+    
+    def _set_landmarks(self, hands, frame_shape):
+        """Store normalized (hands, 21, 3) landmarks in pixel coordinates and classify them."""
+        h, w = frame_shape[:2]
+        hands[..., 0] *= w
+        hands[..., 1] *= h
+        self._store_landmarks(hands)
+    
+    def _store_landmarks(self, hands):
+        """Store pixel-coordinate (hands, 21, 3) landmarks and classify them."""
+        self.landmarks = hands
+        
+        fingers, gestures = self.classify_hands(hands)
+        self.hand_results = [HandResult(hands[i], fingers[i].tolist(), gestures[i])
+                             for i in range(len(hands))]
+    
+    def classify_hands(self, hands):
+        """Compute finger states and gesture labels for all hands in one pass.
+        
+        Returns a (hands, 5) int array of raised fingers and a list of labels.
+        """
+        hands = np.asarray(hands, np.float32).reshape(-1, 21, 3)
+        if len(hands) == 0:
+            return np.empty((0, 5), np.int8), []
+        
+        fingers = np.empty((len(hands), 5), np.int8)
         # Thumb (special case - compare x coordinates)
-        if len(landmarks) > 4:
-            fingers.append(1 if landmarks[4][1] > landmarks[3][1] else 0)
+        fingers[:, 0] = hands[:, 4, 0] > hands[:, 3, 0]
+        # Other fingers (tip above the joint below it)
+        fingers[:, 1:] = hands[:, FINGER_TIPS, 1] < hands[:, FINGER_JOINTS, 1]
         
-        # Other fingers (compare y coordinates)
-        for i in range(1, 5):
-            if len(landmarks) > tips[i]:
-                fingers.append(1 if landmarks[tips[i]][2] < landmarks[tips[i]-2][2] else 0)
-            else:
-                fingers.append(0)
+        # (hands, patterns) matches, all tested at once
+        matches = ((fingers[:, None] == GESTURE_PATTERNS) | (GESTURE_PATTERNS < 0)).all(axis=2)
+        gestures = [GESTURE_LABELS[row.argmax()] if row.any() else None for row in matches]
+        
+        return fingers, gestures
+    
+    def draw_landmarks(self, frame):
+        """Draw the skeletons of all tracked hands onto the frame in place."""
+        num_hands = len(self.landmarks)
+        if num_hands == 0:
+            return frame
+        if num_hands > self._skeleton_hands:
+            self._allocate_skeleton(num_hands)
         
-        return fingers
+        # Each joint as a zero-length segment, since OpenCV draws nothing for a
+        # 1-point polyline, and every bone as a 2-point polyline between joints
+        joints = self._joints[:num_hands]
+        np.copyto(joints[:, :, 0], self.landmarks[..., :2], casting='unsafe')
+        joints[:, :, 1] = joints[:, :, 0]
+        np.take(joints[:, :, 0], self.skeleton_connections, axis=1, out=self._bones[:num_hands])
+        
+        # The segment lists are views into those buffers, built once, so OpenCV
+        # does not split a new array into per-segment views every frame
+        cv2.polylines(frame, self._bone_list[:num_hands * len(self.skeleton_connections)],
+                      False, (224, 224, 224), 2)
+        cv2.polylines(frame, self._joint_list[:num_hands * 21], False, (0, 0, 255), 7)
+        return frame
+    
+    def _allocate_skeleton(self, num_hands):
+        """Allocate the skeleton segment buffers for num_hands hands."""
+        self._joints = np.empty((num_hands, 21, 2, 2), np.int32)
+        self._bones = np.empty((num_hands, len(self.skeleton_connections), 2, 2), np.int32)
+        self._joint_list = list(self._joints.reshape(-1, 2, 2))
+        self._bone_list = list(self._bones.reshape(-1, 2, 2))
+        self._skeleton_hands = num_hands
+    
+    def _get_result(self, landmarks):
+        """Get the cached result for one hand's landmarks, classifying if not cached."""
+        if isinstance(landmarks, np.ndarray):
+            for result in self.hand_results:
+                if np.may_share_memory(result.landmarks, landmarks):
+                    return result
+        landmarks = np.asarray(landmarks, np.float32).reshape(21, 3)
+        fingers, gestures = self.classify_hands(landmarks)
+        return HandResult(landmarks, fingers[0].tolist(), gestures[0])
+    
+    def get_finger_state(self, landmarks):
+        """Determine which fingers are up based on landmark positions."""
+        if landmarks is None or len(landmarks) < 21:
+            return []
+        return self._get_result(landmarks).fingers
     
     def get_hand_center(self, landmarks):
         """Get the center point of the hand."""
-        if not landmarks:
+        if landmarks is None or len(landmarks) < 21:
             return None
-            
+        
         # Use middle finger tip (landmark 12) as center
-        if len(landmarks) > 12:
-            return (landmarks[12][1], landmarks[12][2])
-        return None
+        return (int(landmarks[12][0]), int(landmarks[12][1]))
     
     def get_index_tip(self, landmarks):
         """Get the index finger tip position."""
-        if not landmarks or len(landmarks) < 9:
+        if landmarks is None or len(landmarks) < 9:
             return None
-        return (landmarks[8][1], landmarks[8][2])
+        return (int(landmarks[8][0]), int(landmarks[8][1]))
     
     def get_middle_tip(self, landmarks):
         """Get the middle finger tip position."""
-        if not landmarks or len(landmarks) < 13:
+        if landmarks is None or len(landmarks) < 13:
             return None
-        return (landmarks[12][1], landmarks[12][2])
+        return (int(landmarks[12][0]), int(landmarks[12][1]))
     
     def is_selection_gesture(self, landmarks):
         """Check if the hand is in selection gesture (index and middle up, others down)."""
-        if not landmarks:
+        if landmarks is None or len(landmarks) < 21:
             return False
-            
-        fingers = self.get_finger_state(landmarks)
-        if len(fingers) >= 5:
-            return fingers[1] and fingers[2] and not fingers[3] and not fingers[4]
-        return False
+        return self._get_result(landmarks).gesture == GESTURE_SELECTION
     
     def is_drawing_gesture(self, landmarks):
         """Check if the hand is in drawing gesture (only index up)."""
-        if not landmarks:
+        if landmarks is None or len(landmarks) < 21:
             return False
-            
-        fingers = self.get_finger_state(landmarks)
-        if len(fingers) >= 5:
-            return fingers[1] and not fingers[2] and not fingers[3] and not fingers[4]
-        return False
+        return self._get_result(landmarks).gesture == GESTURE_DRAWING
     
     def is_eraser_gesture(self, landmarks):
         """Check if the hand is in eraser gesture (fist - all fingers down)."""
-        if not landmarks:
+        if landmarks is None or len(landmarks) < 21:
             return False
-            
-        fingers = self.get_finger_state(landmarks)
-        if len(fingers) >= 5:
-            # Check if all fingers are down (fist gesture)
-            # Allow some tolerance for thumb position
-            thumb_down = fingers[0] == 0 if len(fingers) > 0 else False
-            other_fingers_down = all(finger == 0 for finger in fingers[1:])  # All other fingers down
-            
-            return thumb_down and other_fingers_down
-        return False
+        return self._get_result(landmarks).gesture == GESTURE_ERASER
     
     def is_eraser_gesture_alternative(self, landmarks):
         """Alternative eraser gesture - thumb and index finger down, others up."""
-        if not landmarks:
+        if landmarks is None or len(landmarks) < 21:
             return False
-            
-        fingers = self.get_finger_state(landmarks)
-        if len(fingers) >= 5:
-            # Thumb and index down, others up
-            return (fingers[0] == 0 if len(fingers) > 0 else False and 
-                    fingers[1] == 0 if len(fingers) > 1 else False and 
-                    fingers[2] == 1 if len(fingers) > 2 else False and 
-                    fingers[3] == 1 if len(fingers) > 3 else False and 
-                    fingers[4] == 1 if len(fingers) > 4 else False)
-        return False
+        return self._get_result(landmarks).gesture == GESTURE_ERASER_ALT
+    
+    def get_stats(self):
+        """Get tracking statistics."""
+        return {
+            'roi_hits': self.roi_hits,
+            'roi_misses': self.roi_misses,
+            'frames': self.frame_index,
+            'inference_frames': self.inference_count,
+            'inference_time': self._inference_time or 0.0,
+            'gate': self.motion_gate.get_stats() if self.motion_gate else None
+        }
+    
+    def reset(self):
+        """Forget all tracking state and statistics, e.g. before an unrelated video."""
+        if self.worker is not None:
+            # Results still in flight belong to the previous video
+            while self._pending_crops:
+                self._collect_async()
+        if self.hands:
+            self.hands.reset()
+        
+        self.landmarks = np.empty((0, 21, 3), np.float32)
+        self.hand_results = []
+        self._roi_center = None
+        self._roi_velocity = (0.0, 0.0)
+        self._frames_since_full = 0
+        self.roi_hits = 0
+        self.roi_misses = 0
+        self.predictor.reset()
+        self.frame_index = 0
+        self._last_inference_frame = None
+        self._inference_time = None
+        self.inference_count = 0
+        self.motion_gate = MotionGate() if self.motion_gate else None
+        self.gated = False
     
     def release(self):
         """Release resources."""
-        self.hands.close() 
\ No newline at end of file
+        if self.hands:
+            self.hands.close()
+        if self.worker:
+            self.worker.release()
+            self.worker = None
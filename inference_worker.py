@@ -0,0 +1,217 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from config import *
+
+NUM_LANDMARKS = 21
+RING_HEADER_SIZE = 128  # Ring layout, then the published frame count and shape, ahead of the slots
+
+# int64 header fields
+RING_COUNT = 0
+RING_SHAPE = 1  # Shape of the newest frame, up to 3 dimensions
+RING_NUM_SLOTS = 4
+RING_NDIM = 5
+RING_MAX_SHAPE = 6
+
+class SharedFrameRing:
+    def __init__(self, num_slots=None, max_shape=None, name=None):
+        """Create (or attach to, if name is given) a ring of frame slots in shared memory.
+
+        The creator writes num_slots and max_shape into the header. Attaching
+        reads them from there, and raises ValueError if they differ from the
+        values given, so both sides always agree on the slot layout.
+
+        A ring needs at least two slots: with one, every publish overwrites
+        the frame a reader may be copying.
+        """
+        self.owner = name is None
+        if self.owner:
+            if num_slots is None or max_shape is None:
+                raise ValueError("A new ring needs num_slots and max_shape")
+            if num_slots < 2:
+                raise ValueError(f"A ring needs at least 2 slots, not {num_slots}")
+            size = RING_HEADER_SIZE + num_slots * int(np.prod(max_shape))
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((RING_HEADER_SIZE // 8,), np.int64, buffer=self.shm.buf)
+
+        if self.owner:
+            self.header[:] = 0
+            self.header[RING_NUM_SLOTS] = num_slots
+            self.header[RING_NDIM] = len(max_shape)
+            self.header[RING_MAX_SHAPE:RING_MAX_SHAPE + len(max_shape)] = max_shape
+        else:
+            ndim = int(self.header[RING_NDIM])
+            layout = (int(self.header[RING_NUM_SLOTS]),
+                      tuple(int(n) for n in self.header[RING_MAX_SHAPE:RING_MAX_SHAPE + ndim]))
+            expected = (layout[0] if num_slots is None else num_slots,
+                        layout[1] if max_shape is None else tuple(max_shape))
+            if layout != expected:
+                self.header = None
+                self.shm.close()
+                raise ValueError(f"Ring {name} has {layout[0]} slots of {layout[1]}, "
+                                 f"expected {expected[0]} slots of {expected[1]}")
+            num_slots, max_shape = layout
+
+        self.num_slots = num_slots
+        self.max_shape = tuple(max_shape)
+        self.slot_size = int(np.prod(self.max_shape))
+        self.slots = np.ndarray((num_slots, self.slot_size), np.uint8, buffer=self.shm.buf,
+                                offset=RING_HEADER_SIZE)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape):
+        """Get a writable array view of a slot with the given frame shape."""
+        return self.slots[slot, :int(np.prod(shape))].reshape(shape)
+
+    def write(self, slot, frame):
+        """Copy a frame into a slot and return its shape."""
+        if frame.size > self.slot_size:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit ring slot {self.max_shape}")
+        np.copyto(self.view(slot, frame.shape), frame)
+        return frame.shape
+
+    def publish(self, frame):
+        """Write a frame to the next slot and announce it to readers of the ring."""
+        count = int(self.header[RING_COUNT])
+        self.write(count % self.num_slots, frame)
+        self.header[RING_SHAPE:RING_SHAPE + frame.ndim] = frame.shape
+        self.header[RING_COUNT] = count + 1  # Last, so readers never see a half-written frame
+        return count
+
+    def latest(self):
+        """Get (count, frame view) for the newest published frame; count is 0 if none yet."""
+        count = int(self.header[RING_COUNT])
+        if count == 0:
+            return 0, None
+        shape = tuple(int(n) for n in self.header[RING_SHAPE:RING_SHAPE + len(self.max_shape)])
+        return count, self.view((count - 1) % self.num_slots, shape)
+
+    def close(self):
+        """Detach from the shared memory, removing it if we created it."""
+        self.header = None
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _inference_worker_main(conn, ring_name, result_name, num_slots, max_shape, max_hands,
+                           detection_confidence, tracking_confidence):
+    """Worker process entry point: run MediaPipe on frames from the shared ring."""
+    import cv2
+    import mediapipe as mp
+
+    ring = SharedFrameRing(num_slots, max_shape, name=ring_name)
+    result_shm = shared_memory.SharedMemory(name=result_name)
+    results = np.ndarray((num_slots, max_hands, NUM_LANDMARKS, 3), np.float32,
+                         buffer=result_shm.buf)
+    hands = mp.solutions.hands.Hands(
+        static_image_mode=False,
+        max_num_hands=max_hands,
+        min_detection_confidence=detection_confidence,
+        min_tracking_confidence=tracking_confidence
+    )
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+
+            seq, slot, shape = message
+            rgb_frame = cv2.cvtColor(ring.view(slot, shape), cv2.COLOR_BGR2RGB)
+            detected = hands.process(rgb_frame)
+
+            num_hands = 0
+            if detected.multi_hand_landmarks:
+                for hand_landmarks in detected.multi_hand_landmarks[:max_hands]:
+                    out = results[slot, num_hands]
+                    for id, lm in enumerate(hand_landmarks.landmark):
+                        out[id] = (lm.x, lm.y, lm.z)
+                    num_hands += 1
+
+            conn.send((seq, slot, num_hands))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        hands.close()
+        results = None
+        result_shm.close()
+        ring.close()
+
+class InferenceWorker:
+    def __init__(self, frame_shape, num_slots=INFERENCE_RING_SLOTS, max_hands=MAX_NUM_HANDS):
+        """Start a MediaPipe worker process fed through a shared-memory frame ring."""
+        self.num_slots = num_slots
+        self.max_hands = max_hands
+        self.ring = SharedFrameRing(num_slots, frame_shape)
+
+        result_size = num_slots * max_hands * NUM_LANDMARKS * 3 * np.dtype(np.float32).itemsize
+        self.result_shm = shared_memory.SharedMemory(create=True, size=result_size)
+        self.results = np.ndarray((num_slots, max_hands, NUM_LANDMARKS, 3), np.float32,
+                                  buffer=self.result_shm.buf)
+
+        # Spawn keeps the child clean of our threads and MediaPipe state
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_inference_worker_main,
+            args=(child_conn, self.ring.name, self.result_shm.name, num_slots,
+                  self.ring.max_shape, max_hands, HAND_DETECTION_CONFIDENCE,
+                  HAND_TRACKING_CONFIDENCE),
+            name="HandInferenceWorker",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.next_seq = 0
+        self.next_slot = 0
+        self.pending = []  # Sequence numbers submitted but not yet collected
+
+    def submit(self, frame):
+        """Queue a BGR frame for inference without waiting for the result."""
+        if len(self.pending) >= self.num_slots:
+            # Every slot is in flight; wait for the oldest before reusing one
+            self.collect()
+
+        slot = self.next_slot
+        shape = self.ring.write(slot, frame)
+        self.conn.send((self.next_seq, slot, shape))
+        self.pending.append(self.next_seq)
+
+        self.next_seq += 1
+        self.next_slot = (slot + 1) % self.num_slots
+
+    def poll(self):
+        """Check whether the oldest pending frame has a result ready."""
+        return bool(self.pending) and self.conn.poll()
+
+    def collect(self):
+        """Wait for the oldest pending frame and return its normalized landmarks."""
+        if not self.pending:
+            return None
+
+        seq, slot, num_hands = self.conn.recv()
+        self.pending.remove(seq)
+        return self.results[slot, :num_hands].copy()
+
+    def release(self):
+        """Stop the worker process and free the shared memory."""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+        self.results = None
+        self.result_shm.close()
+        self.result_shm.unlink()
+        self.ring.close()
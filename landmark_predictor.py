@@ -0,0 +1,51 @@
+import numpy as np
+from config import *
+
+class LandmarkPredictor:
+    def __init__(self, velocity_gain=PREDICTION_VELOCITY_GAIN, max_frames=PREDICTION_MAX_FRAMES):
+        """Initialize a constant-velocity (alpha-beta) model for hand landmarks.
+
+        Detections are taken as-is; the velocity follows them with the given gain,
+        and landmarks are extrapolated for frames without a detection.
+        """
+        self.velocity_gain = velocity_gain
+        self.max_frames = max_frames
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked hands."""
+        self.position = None
+        self.velocity = None
+        self.frame_index = None
+
+    def update(self, hands, frame_index):
+        """Correct the model with (hands, 21, 3) landmarks detected in frame frame_index."""
+        if len(hands) == 0:
+            self.reset()
+            return
+
+        if (self.position is None or self.position.shape != hands.shape or
+                frame_index <= self.frame_index):
+            # New or different hands - start from rest
+            self.position = hands.copy()
+            self.velocity = np.zeros_like(hands)
+            self.frame_index = frame_index
+            return
+
+        dt = frame_index - self.frame_index
+        residual = hands - (self.position + self.velocity * dt)
+        self.velocity += residual * (self.velocity_gain / dt)
+        self.position = hands.copy()
+        self.frame_index = frame_index
+
+    def predict(self, frame_index):
+        """Get landmarks for frame frame_index; empty once the hands are too stale."""
+        if self.position is None:
+            return np.empty((0, 21, 3), np.float32)
+
+        dt = frame_index - self.frame_index
+        if dt <= 0:
+            return self.position.copy()
+        if dt > self.max_frames:
+            return np.empty((0, 21, 3), np.float32)
+        return self.position + self.velocity * dt
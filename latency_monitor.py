@@ -0,0 +1,131 @@
+import os
+import time
+import numpy as np
+from config import *
+
+PERCENTILES = (50, 95, 99)
+
+class LatencyMonitor:
+    def __init__(self, window=LATENCY_WINDOW, export_path=LATENCY_EXPORT_PATH,
+                 export_interval=LATENCY_EXPORT_INTERVAL, enabled=True):
+        """Initialize per-stage frame timing over a rolling window of frames.
+
+        Stages are timed as laps: each lap() ends the stage that began at the
+        previous lap (or the frame start). Statistics are exported to
+        export_path every export_interval seconds, as Prometheus text if the
+        name ends in .prom and as CSV otherwise.
+        """
+        self.window = window
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.enabled = enabled
+
+        # Per stage: a ring of the last window durations, how many were recorded,
+        # and their running total
+        self.stages = []
+        self.samples = {}
+        self.counts = {}
+        self.totals = {}
+
+        self._frame = {}  # Stage durations of the frame in progress
+        self._frame_start = None
+        self._last = None
+        self._last_export = time.monotonic()
+
+    def begin_frame(self):
+        """Start timing a frame."""
+        if not self.enabled:
+            return
+        self._frame.clear()
+        self._frame_start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """End a stage: charge it the time since the previous lap."""
+        if not self.enabled or self._last is None:
+            return
+        now = time.perf_counter()
+        self._frame[stage] = self._frame.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def end_frame(self):
+        """Record the frame's stages and total, exporting if it is time to."""
+        if not self.enabled or self._frame_start is None:
+            return
+        for stage, seconds in self._frame.items():
+            self._record(stage, seconds)
+        self._record('frame', time.perf_counter() - self._frame_start)
+        self._frame_start = self._last = None
+
+        if self.export_path and time.monotonic() - self._last_export >= self.export_interval:
+            self.export()
+
+    def _record(self, stage, seconds):
+        ring = self.samples.get(stage)
+        if ring is None:
+            ring = self.samples[stage] = np.zeros(self.window)
+            self.counts[stage] = 0
+            self.totals[stage] = 0.0
+            self.stages.append(stage)
+        ring[self.counts[stage] % self.window] = seconds
+        self.counts[stage] += 1
+        self.totals[stage] += seconds
+
+    def get_stats(self):
+        """Get {stage: (p50, p95, p99) in seconds} over the window, in first-seen order."""
+        stats = {}
+        for stage in self.stages:
+            recent = self.samples[stage][:min(self.counts[stage], self.window)]
+            stats[stage] = tuple(np.percentile(recent, PERCENTILES))
+        return stats
+
+    def format_rows(self):
+        """Get the stats as (stage, p50, p95, p99) text rows in milliseconds, with a header."""
+        rows = [('stage', 'p50', 'p95', 'p99')]
+        for stage, quantiles in self.get_stats().items():
+            rows.append((stage,) + tuple(f"{q * 1000:.2f}" for q in quantiles))
+        return rows
+
+    def format_lines(self):
+        """Get the stats as aligned text lines in milliseconds."""
+        return [f"{stage:<14}{p50:>8}{p95:>8}{p99:>8}" for stage, p50, p95, p99 in self.format_rows()]
+
+    def export(self, path=None):
+        """Write the current stats to a Prometheus text file or append them to a CSV."""
+        path = path or self.export_path
+        self._last_export = time.monotonic()
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if path.endswith('.prom'):
+                self._export_prometheus(path)
+            else:
+                self._export_csv(path)
+        except OSError as e:
+            print(f"Error exporting latency metrics: {e}")
+
+    def _export_prometheus(self, path):
+        name = "virtual_painter_stage_latency_seconds"
+        lines = [f"# HELP {name} Time spent per frame in each main loop stage.",
+                 f"# TYPE {name} summary"]
+        for stage, quantiles in self.get_stats().items():
+            for percentile, value in zip(PERCENTILES, quantiles):
+                lines.append(f'{name}{{stage="{stage}",quantile="{percentile / 100}"}} {value:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {self.totals[stage]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {self.counts[stage]}')
+
+        # Replace the file in one step so a scraper never reads half of it
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def _export_csv(self, path):
+        new_file = not os.path.exists(path)
+        timestamp = time.time()
+        with open(path, 'a') as f:
+            if new_file:
+                f.write("timestamp,stage,count,p50_ms,p95_ms,p99_ms\n")
+            for stage, (p50, p95, p99) in self.get_stats().items():
+                f.write(f"{timestamp:.3f},{stage},{self.counts[stage]},"
+                        f"{p50 * 1000:.3f},{p95 * 1000:.3f},{p99 * 1000:.3f}\n")
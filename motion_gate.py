@@ -0,0 +1,94 @@
+import time
+import cv2
+from config import *
+
+class MotionGate:
+    def __init__(self, width=MOTION_GATE_WIDTH, pixel_threshold=MOTION_GATE_PIXEL_THRESHOLD,
+                 min_area=MOTION_GATE_MIN_AREA, hold_frames=MOTION_GATE_HOLD_FRAMES):
+        """Initialize a frame-difference gate that idles inference on static scenes.
+
+        Frames are compared at a small grayscale size; the gate closes once the
+        scene has been still, with no hand seen, for hold_frames frames.
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.hold_frames = hold_frames
+
+        # Downsampled buffers, allocated for the first frame's size
+        self._size = None
+        self._small_size = None
+        self._resized = None
+        self._current = None
+        self._previous = None
+        self._diff = None
+
+        self.idle_frames = 0
+        self.gated = False
+
+        # Statistics
+        self.frames = 0
+        self.gated_frames = 0
+        self.gated_time = 0.0
+        self._gated_since = None
+
+    def has_motion(self, frame):
+        """Compare the frame with the previous one at low resolution."""
+        h, w = frame.shape[:2]
+        if self._size != (w, h):
+            # New input size - start over with fresh buffers
+            small_w = min(self.width, w)
+            self._small_size = (small_w, max(1, round(h * small_w / w)))
+            self._size = (w, h)
+            self._resized = self._current = self._previous = self._diff = None
+
+        self._resized = cv2.resize(frame, self._small_size, dst=self._resized,
+                                   interpolation=cv2.INTER_AREA)
+        self._current = cv2.cvtColor(self._resized, cv2.COLOR_BGR2GRAY, dst=self._current)
+        if self._previous is None:
+            self._previous = self._current.copy()
+            return True
+
+        self._diff = cv2.absdiff(self._current, self._previous, dst=self._diff)
+        _, self._diff = cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY,
+                                      dst=self._diff)
+        changed = cv2.countNonZero(self._diff)
+
+        # Keep this frame as the reference for the next one
+        self._current, self._previous = self._previous, self._current
+        return changed > self.min_area * self._diff.size
+
+    def update(self, frame, hand_present):
+        """Decide whether the frame needs inference. Returns False while gated."""
+        self.frames += 1
+        if self.has_motion(frame) or hand_present:
+            self.idle_frames = 0
+        else:
+            self.idle_frames += 1
+
+        gated = self.idle_frames >= self.hold_frames
+        if gated != self.gated:
+            now = time.perf_counter()
+            if gated:
+                self._gated_since = now
+            else:
+                # Motion re-arms immediately
+                self.gated_time += now - self._gated_since
+                self._gated_since = None
+            self.gated = gated
+
+        if gated:
+            self.gated_frames += 1
+        return not gated
+
+    def get_stats(self):
+        """Get gating statistics."""
+        gated_time = self.gated_time
+        if self._gated_since is not None:
+            gated_time += time.perf_counter() - self._gated_since
+        return {
+            'frames': self.frames,
+            'gated_frames': self.gated_frames,
+            'gated_time': gated_time,
+            'gated': self.gated
+        }
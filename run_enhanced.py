@@ -41,6 +41,18 @@ def check_modules():
         'hand_tracker.py', 
         'canvas_manager.py',
         'ui_manager.py',
+        'frame_capture.py',
+        'frame_display.py',
+        'video_writer.py',
+        'frame_source.py',
+        'buffer_pool.py',
+        'latency_monitor.py',
+        'inference_worker.py',
+        'frame_pacer.py',
+        'stroke_store.py',
+        'landmark_predictor.py',
+        'motion_gate.py',
+        'session_recorder.py',
         'virtual_painter_enhanced.py'
     ]
     
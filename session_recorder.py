@@ -0,0 +1,227 @@
+import os
+import queue
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from config import *
+from frame_source import FrameSource
+
+# File layout: a fixed header, then for each frame a fixed-size record followed
+# by its encoded image, then an index of all records. The header points at the
+# index once the recording is closed; a recording cut short is indexed by
+# walking the records instead. The whole file is memory-mapped for replay.
+SESSION_MAGIC = b"VPSESS02"
+SESSION_HEADER = struct.Struct("<8sIIIIQQ")  # magic, height, width, channels, max hands, index offset, frames
+SESSION_HEADER_SIZE = 64
+NO_KEY = 255
+
+def session_dtype(max_hands):
+    """Get the per-frame record layout."""
+    return np.dtype([
+        ('timestamp', '<f8'),           # Seconds since recording started
+        ('key', '<i4'),                 # Key pressed during the frame, NO_KEY if none
+        ('num_hands', '<i4'),
+        ('landmarks', '<f4', (max_hands, 21, 3)),  # Pixel coordinates in the mirrored display
+        ('offset', '<u8'),              # Encoded frame (captured, before mirroring) in the file
+        ('size', '<u8')
+    ])
+
+class SessionRecorder:
+    def __init__(self, path, frame_shape, max_hands=MAX_NUM_HANDS, frame_format=SESSION_FRAME_FORMAT,
+                 frame_scale=SESSION_FRAME_SCALE, quality=SESSION_JPEG_QUALITY, queue_size=SESSION_QUEUE_SIZE):
+        """Open a session file for recording frames of the given shape.
+
+        write() only copies the frame (downscaled by frame_scale) into a reused
+        slot; encoding and file writes happen on a background thread, which
+        write() waits for only when it is queue_size frames behind. No frame
+        is ever dropped.
+        """
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.max_hands = max_hands
+        self.dtype = session_dtype(max_hands)
+        self.frame_format = frame_format
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality] if frame_format == ".jpg" else []
+        self.frames = 0
+        self.start_time = None
+        self.error = None
+
+        height, width = self.frame_shape[:2]
+        self.stored_size = (max(1, round(width * frame_scale)), max(1, round(height * frame_scale)))
+        stored_shape = (self.stored_size[1], self.stored_size[0]) + self.frame_shape[2:]
+
+        self._queue = queue.Queue(queue_size)
+        self._frames = [np.empty(stored_shape, np.uint8) for _ in range(queue_size + 1)]
+        self._records = np.zeros(queue_size + 1, self.dtype)
+        self._free = queue.SimpleQueue()
+        for slot in range(queue_size + 1):
+            self._free.put(slot)
+        self._index = []
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'wb')
+        self._write_header(0)
+        self._position = SESSION_HEADER_SIZE
+        self._thread = threading.Thread(target=self._write_loop, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def _write_header(self, index_offset):
+        height, width = self.frame_shape[:2]
+        channels = self.frame_shape[2] if len(self.frame_shape) > 2 else 1
+        header = SESSION_HEADER.pack(SESSION_MAGIC, height, width, channels, self.max_hands,
+                                     index_offset, len(self._index))
+        self.file.seek(0)
+        self.file.write(header.ljust(SESSION_HEADER_SIZE, b'\0'))
+
+    def write(self, frame, landmarks, key=NO_KEY, timestamp=None):
+        """Queue one frame with its (hands, 21, 3) landmarks and key press for recording."""
+        if self.error:
+            raise OSError(f"Error recording {self.path}: {self.error}")
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = timestamp
+
+        slot = self._free.get()
+        record = self._records[slot]
+        num_hands = min(len(landmarks), self.max_hands)
+        record['timestamp'] = timestamp - self.start_time
+        record['key'] = key
+        record['num_hands'] = num_hands
+        record['landmarks'][:num_hands] = landmarks[:num_hands]
+        record['landmarks'][num_hands:] = 0
+        if self._frames[slot].shape[:2] == frame.shape[:2]:
+            np.copyto(self._frames[slot], frame)
+        else:
+            cv2.resize(frame, self.stored_size, dst=self._frames[slot], interpolation=cv2.INTER_AREA)
+        self._queue.put(slot)
+
+    def _write_loop(self):
+        """Encode and append queued frames until close() sends None."""
+        while True:
+            slot = self._queue.get()
+            if slot is None:
+                break
+            try:
+                if self.error is None:
+                    self._write_record(slot)
+            except (cv2.error, OSError) as e:
+                self.error = e
+            self._free.put(slot)
+
+    def _write_record(self, slot):
+        success, data = cv2.imencode(self.frame_format, self._frames[slot], self.encode_params)
+        if not success:
+            raise OSError(f"Could not encode frame as {self.frame_format}")
+        record = self._records[slot:slot + 1]
+        record['offset'] = self._position + self.dtype.itemsize
+        record['size'] = len(data)
+        self.file.write(memoryview(record).cast('B'))
+        self.file.write(memoryview(data).cast('B'))
+        self._position += self.dtype.itemsize + len(data)
+        self._index.append(record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        """Record the frames still queued, write the index and close the session file."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self.file:
+            self.file.write(b''.join(self._index))
+            self._write_header(self._position)
+            self.file.close()
+            self.file = None
+
+class SessionPlayer(FrameSource):
+    def __init__(self, path, realtime=False):
+        """Memory-map a recorded session for replay.
+
+        With realtime, read() waits so frames come at their recorded times;
+        otherwise they come as fast as they are asked for.
+        """
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+
+        with open(path, 'rb') as f:
+            header = f.read(SESSION_HEADER_SIZE)
+        if len(header) < SESSION_HEADER.size or header[:8] != SESSION_MAGIC:
+            raise ValueError(f"{path} is not a recorded session")
+        _, height, width, channels, max_hands, index_offset, count = SESSION_HEADER.unpack_from(header)
+
+        dtype = session_dtype(max_hands)
+        self.data = np.memmap(path, np.uint8, mode='r')
+        if index_offset:
+            records = self.data[index_offset:index_offset + count * dtype.itemsize].view(dtype)
+        else:
+            # A recording cut short still replays up to its last complete frame
+            records = self._scan_records(dtype)
+        if len(records) == 0:
+            raise ValueError(f"{path} has no recorded frames")
+        self.frame_shape = (height, width, channels) if channels > 1 else (height, width)
+        self.frame_count = len(records)
+        self.records = records
+
+        self.position = 0
+        self.landmarks = np.empty((0, 21, 3), np.float32)
+        self.key = NO_KEY
+        self.start_time = None
+
+    def _scan_records(self, dtype):
+        """Index an unclosed recording by walking its records."""
+        records = []
+        position = SESSION_HEADER_SIZE
+        while position + dtype.itemsize <= len(self.data):
+            record = self.data[position:position + dtype.itemsize].view(dtype)
+            end = int(record['offset'][0] + record['size'][0])
+            if end <= position or end > len(self.data):
+                break
+            records.append(record)
+            position = end
+        return np.concatenate(records) if records else np.zeros(0, dtype)
+
+    def isOpened(self):
+        return self.records is not None
+
+    def _read_into(self, frame):
+        """Decode the next recorded frame into frame; its landmarks and key go to landmarks and key."""
+        if self.records is None or self.position >= self.frame_count:
+            return False, None
+
+        record = self.records[self.position]
+        self.position += 1
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self.start_time is None:
+                self.start_time = now - record['timestamp']
+            delay = self.start_time + record['timestamp'] - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self.landmarks = np.array(record['landmarks'][:record['num_hands']])
+        self.key = int(record['key'])
+        offset = int(record['offset'])
+        decoded = cv2.imdecode(self.data[offset:offset + int(record['size'])], cv2.IMREAD_UNCHANGED)
+        if decoded is None:
+            raise ValueError(f"Frame {self.position - 1} of {self.path} is corrupt")
+        if frame is None or frame.shape != self.frame_shape:
+            frame = np.empty(self.frame_shape, np.uint8)
+        if decoded.shape == self.frame_shape:
+            np.copyto(frame, decoded)
+        else:
+            # Frames recorded downscaled come back at the size the landmarks refer to
+            cv2.resize(decoded, (self.frame_shape[1], self.frame_shape[0]), dst=frame,
+                       interpolation=cv2.INTER_LINEAR)
+        return True, frame
+
+    def release(self):
+        """Unmap the session file."""
+        self.records = None
+        self.data = None
@@ -0,0 +1,299 @@
+import base64
+import cv2
+import numpy as np
+from config import *
+
+class StrokeStore:
+    def __init__(self, point_capacity=4096, stroke_capacity=256):
+        """Initialize an empty store of vector strokes.
+
+        Points of all strokes live in one growable (N, 2) array; each stroke is
+        a slice of it with a BGRA color (alpha 0 for the eraser), a thickness
+        and a bounding box, kept in parallel arrays so box queries are a single
+        vectorized test. Strokes [0, index) are applied to the canvas; the rest
+        were undone and can be redone.
+        """
+        self.points = np.zeros((point_capacity, 2), np.float32)
+        self.starts = np.zeros(stroke_capacity, np.int64)
+        self.lengths = np.zeros(stroke_capacity, np.int64)
+        self.colors = np.zeros((stroke_capacity, 4), np.uint8)
+        self.thickness = np.zeros(stroke_capacity, np.float32)
+        self.bounds = np.zeros((stroke_capacity, 4), np.int32)  # x1, y1, x2, y2 (exclusive)
+        self.count = 0
+        self.index = 0
+        self.is_open = False  # Whether the last stroke is still being drawn
+
+    def __len__(self):
+        return self.index
+
+    def reset(self):
+        """Drop all strokes."""
+        self.count = 0
+        self.index = 0
+        self.is_open = False
+
+    def can_undo(self):
+        return self.index > 0
+
+    def can_redo(self):
+        return self.index < self.count
+
+    def memory_used(self):
+        """Bytes taken by the applied and redoable strokes."""
+        num_points = self.num_points()
+        per_stroke = (self.starts.itemsize + self.lengths.itemsize + self.colors[0].nbytes +
+                      self.thickness.itemsize + self.bounds[0].nbytes)
+        return num_points * self.points[0].nbytes + self.count * per_stroke
+
+    def _grow(self, num_points, num_strokes=1):
+        """Make room for num_strokes more strokes and num_points more points."""
+        used = self.num_points()
+        if used + num_points > len(self.points):
+            grown = np.zeros((max(2 * len(self.points), used + num_points), 2), np.float32)
+            grown[:used] = self.points[:used]
+            self.points = grown
+        if self.count + num_strokes > len(self.starts):
+            size = max(2 * len(self.starts), self.count + num_strokes)
+            for name in ('starts', 'lengths', 'colors', 'thickness', 'bounds'):
+                array = getattr(self, name)
+                grown = np.zeros((size,) + array.shape[1:], array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        return used
+
+    def continues(self, point, color, thickness):
+        """Check whether a segment from point with this style extends the open stroke."""
+        if not self.is_open:
+            return False
+        i = self.count - 1
+        last = self.points[self.starts[i] + self.lengths[i] - 1]
+        return (tuple(last) == tuple(point) and tuple(self.colors[i]) == tuple(color) and
+                self.thickness[i] == thickness)
+
+    def begin(self, point, color, thickness):
+        """Start a stroke at point. Strokes that could have been redone are discarded."""
+        self.count = self.index
+        start = self._grow(1)
+        i = self.count
+        self.starts[i] = start
+        self.lengths[i] = 1
+        self.points[start] = point
+        self.colors[i] = color
+        self.thickness[i] = thickness
+        self.bounds[i] = _segment_rect(point, point, thickness)
+        self.count += 1
+        self.index = self.count
+        self.is_open = True
+
+    def extend(self, point):
+        """Add a point to the open stroke."""
+        i = self.count - 1
+        position = self._grow(1)
+        self.points[position] = point
+        self.lengths[i] += 1
+        x1, y1, x2, y2 = _segment_rect(point, point, self.thickness[i])
+        bounds = self.bounds[i]
+        bounds[:] = (min(bounds[0], x1), min(bounds[1], y1), max(bounds[2], x2), max(bounds[3], y2))
+
+    def end(self):
+        """Finish the open stroke, if any."""
+        self.is_open = False
+
+    def num_points(self):
+        """Points held by the applied and redoable strokes."""
+        return int(self.starts[self.count - 1] + self.lengths[self.count - 1]) if self.count else 0
+
+    def append(self, other, n=None):
+        """Append copies of the n oldest applied strokes of other (all by default).
+
+        Strokes that could have been redone here are discarded.
+        """
+        n = other.index if n is None else min(n, other.index)
+        self.end()
+        self.count = self.index
+        if n <= 0:
+            return
+        first = int(other.starts[0])
+        used = int(other.starts[n - 1] + other.lengths[n - 1]) - first
+        start = self._grow(used, n)
+        self.points[start:start + used] = other.points[first:first + used]
+        added = slice(self.count, self.count + n)
+        self.starts[added] = other.starts[:n] - first + start
+        for name in ('lengths', 'colors', 'thickness', 'bounds'):
+            getattr(self, name)[added] = getattr(other, name)[:n]
+        self.count += n
+        self.index = self.count
+
+    def drop_oldest(self, n):
+        """Forget the n oldest strokes, e.g. once they are flattened into a raster."""
+        n = min(n, self.index)
+        if n <= 0:
+            return
+        used = self.num_points()
+        offset = int(self.starts[n]) if n < self.count else used
+        self.points[:used - offset] = self.points[offset:used]
+        for name in ('starts', 'lengths', 'colors', 'thickness', 'bounds'):
+            array = getattr(self, name)
+            array[:self.count - n] = array[n:self.count]
+        self.count -= n
+        self.index -= n
+        self.starts[:self.count] -= offset
+
+    def undo(self):
+        """Take back the last applied stroke. Returns its bounds, or None."""
+        self.end()
+        if not self.can_undo():
+            return None
+        self.index -= 1
+        return tuple(int(v) for v in self.bounds[self.index])
+
+    def redo(self):
+        """Reapply the next undone stroke. Returns its index, or None."""
+        self.end()
+        if not self.can_redo():
+            return None
+        self.index += 1
+        return self.index - 1
+
+    def get_rect(self, i):
+        """Bounds (x1, y1, x2, y2) of stroke i."""
+        return tuple(int(v) for v in self.bounds[i])
+
+    def query(self, rect):
+        """Indices of applied strokes whose bounds intersect rect (x1, y1, x2, y2), oldest first."""
+        bounds = self.bounds[:self.index]
+        hits = ((bounds[:, 0] < rect[2]) & (bounds[:, 2] > rect[0]) &
+                (bounds[:, 1] < rect[3]) & (bounds[:, 3] > rect[1]))
+        return np.flatnonzero(hits)
+
+    def get_points(self, i):
+        """The (n, 2) points of stroke i, as a view."""
+        return self.points[self.starts[i]:self.starts[i] + self.lengths[i]]
+
+    def draw_stroke(self, image, i, rect=None):
+        """Rasterize stroke i into image, skipping segments that cannot reach rect.
+
+        Segments are drawn one at a time exactly as they were drawn live, so
+        re-rasterizing reproduces the original pixels.
+        """
+        points = np.rint(self.get_points(i)).astype(np.int32)
+        thickness = max(1, int(round(float(self.thickness[i]))))
+        color = tuple(int(c) for c in self.colors[i])
+        if len(points) > 1:
+            starts, ends = points[:-1], points[1:]
+        else:
+            starts = ends = points  # A single point is drawn as a dot
+        if rect is not None:
+            pad = thickness // 2 + 2
+            reach = ((np.minimum(starts[:, 0], ends[:, 0]) - pad < rect[2]) &
+                     (np.maximum(starts[:, 0], ends[:, 0]) + pad + 1 > rect[0]) &
+                     (np.minimum(starts[:, 1], ends[:, 1]) - pad < rect[3]) &
+                     (np.maximum(starts[:, 1], ends[:, 1]) + pad + 1 > rect[1]))
+            starts, ends = starts[reach], ends[reach]
+
+        line_type = cv2.LINE_AA if BRUSH_ANTIALIAS else cv2.LINE_8
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            cv2.line(image, start, end, color, thickness, line_type)
+
+    def draw(self, image, rect=None):
+        """Rasterize the applied strokes that reach rect (all if None) into image, in order."""
+        indices = range(self.index) if rect is None else self.query(rect)
+        for i in indices:
+            self.draw_stroke(image, i, rect)
+
+    def scale(self, sx, sy):
+        """Scale all strokes, e.g. to a resized canvas."""
+        if not self.count:
+            return
+        used = int(self.starts[self.count - 1] + self.lengths[self.count - 1])
+        self.points[:used] *= (sx, sy)
+        self.thickness[:self.count] *= (sx + sy) / 2
+        for i in range(self.count):
+            points = self.get_points(i)
+            self.bounds[i] = _points_rect(points, self.thickness[i])
+
+    def save(self, path, width, height, base=None):
+        """Write the applied strokes (and an optional raster base) to a compressed .npz file."""
+        n = self.index
+        used = int(self.starts[n - 1] + self.lengths[n - 1]) if n else 0
+        arrays = {
+            'size': np.array([width, height], np.int32),
+            'points': self.points[:used],
+            'lengths': self.lengths[:n].astype(np.int32),
+            'colors': self.colors[:n],
+            'thickness': self.thickness[:n],
+        }
+        if base is not None:
+            arrays['base'] = base
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Read strokes saved by save(). Returns (store, (width, height), base or None)."""
+        with np.load(path) as data:
+            lengths = data['lengths'].astype(np.int64)
+            store = cls(max(len(data['points']), 1), max(len(lengths), 1))
+            store.points[:len(data['points'])] = data['points']
+            store.lengths[:len(lengths)] = lengths
+            store.starts[:len(lengths)] = np.cumsum(lengths) - lengths
+            store.colors[:len(lengths)] = data['colors']
+            store.thickness[:len(lengths)] = data['thickness']
+            store.count = store.index = len(lengths)
+            for i in range(store.count):
+                store.bounds[i] = _points_rect(store.get_points(i), store.thickness[i])
+            size = tuple(int(v) for v in data['size'])
+            base = data['base'] if 'base' in data else None
+        return store, size, base
+
+    def to_svg(self, width, height, base=None):
+        """Render the applied strokes as an SVG document.
+
+        Eraser strokes become masks over everything drawn before them, so the
+        result matches the raster canvas at any resolution.
+        """
+        body = []
+        defs = []
+        if base is not None:
+            # PNG holds straight alpha; flattened strokes have soft, premultiplied edges
+            alpha = base[..., 3:].astype(np.float32)
+            straight = base.copy()
+            straight[..., :3] = np.clip(base[..., :3] * (255 / np.maximum(alpha, 1)) + 0.5, 0, 255)
+            _, png = cv2.imencode('.png', straight)
+            data = base64.b64encode(png.tobytes()).decode('ascii')
+            body.append(f'<image width="{width}" height="{height}" href="data:image/png;base64,{data}"/>')
+
+        for i in range(self.index):
+            points = " ".join(f"{x:.1f},{y:.1f}" for x, y in self.get_points(i).tolist())
+            b, g, r, a = (int(c) for c in self.colors[i])
+            stroke = f'stroke-width="{self.thickness[i]:.1f}" points="{points}"'
+            if a == 0:
+                mask_id = f"erase{i}"
+                defs.append(f'<mask id="{mask_id}" maskUnits="userSpaceOnUse" x="0" y="0" '
+                            f'width="{width}" height="{height}">'
+                            f'<rect width="{width}" height="{height}" fill="white"/>'
+                            f'<polyline stroke="black" {stroke}/></mask>')
+                body = [f'<g mask="url(#{mask_id})">'] + body + ['</g>']
+            else:
+                body.append(f'<polyline stroke="#{r:02x}{g:02x}{b:02x}" {stroke}/>')
+
+        return "\n".join([
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}">',
+            f'<defs>{"".join(defs)}</defs>',
+            '<g fill="none" stroke-linecap="round" stroke-linejoin="round">',
+            *body,
+            '</g>',
+            '</svg>',
+        ]) + "\n"
+
+def _segment_rect(start, end, thickness):
+    """Area a line can touch, (x1, y1, x2, y2), padded like CanvasManager.draw_line."""
+    pad = max(1, int(round(float(thickness)))) // 2 + 2
+    x0, y0 = int(round(float(start[0]))), int(round(float(start[1])))
+    x1, y1 = int(round(float(end[0]))), int(round(float(end[1])))
+    return (min(x0, x1) - pad, min(y0, y1) - pad, max(x0, x1) + pad + 1, max(y0, y1) + pad + 1)
+
+def _points_rect(points, thickness):
+    """Area a stroke through points can touch."""
+    points = np.rint(points)
+    return _segment_rect(points.min(axis=0), points.max(axis=0), thickness)
@@ -14,6 +14,18 @@ def test_imports():
         ('hand_tracker', 'hand_tracker.py'),
         ('canvas_manager', 'canvas_manager.py'),
         ('ui_manager', 'ui_manager.py'),
+        ('frame_capture', 'frame_capture.py'),
+        ('frame_display', 'frame_display.py'),
+        ('video_writer', 'video_writer.py'),
+        ('frame_source', 'frame_source.py'),
+        ('buffer_pool', 'buffer_pool.py'),
+        ('latency_monitor', 'latency_monitor.py'),
+        ('inference_worker', 'inference_worker.py'),
+        ('frame_pacer', 'frame_pacer.py'),
+        ('stroke_store', 'stroke_store.py'),
+        ('landmark_predictor', 'landmark_predictor.py'),
+        ('motion_gate', 'motion_gate.py'),
+        ('session_recorder', 'session_recorder.py'),
         ('virtual_painter_enhanced', 'virtual_painter_enhanced.py')
     ]
     
@@ -164,6 +176,354 @@ def test_basic_functionality():
         traceback.print_exc()
         return False
 
+def test_hand_skeleton():
+    """Test that the skeleton pass draws a red marker on every joint."""
+    print("\n🔍 Testing hand skeleton drawing...")
+    
+    try:
+        import numpy as np
+        from hand_tracker import HandTracker
+        
+        hand_tracker = HandTracker(use_process=False)
+        rng = np.random.default_rng(0)
+        hand_tracker.landmarks = np.zeros((2, 21, 3), np.float32)
+        hand_tracker.landmarks[..., :2] = rng.uniform(20, 460, (2, 21, 2))
+        frame = np.zeros((480, 640, 3), np.uint8)
+        hand_tracker.draw_landmarks(frame)
+        hand_tracker.release()
+        
+        points = hand_tracker.landmarks[..., :2].astype(np.int32).reshape(-1, 2)
+        joints = frame[points[:, 1], points[:, 0]]
+        red = (joints == (0, 0, 255)).all(axis=1)
+        if not red.all():
+            print(f"❌ {np.count_nonzero(~red)} of {len(points)} joints have no red marker")
+            return False
+        
+        print(f"✅ All {len(points)} joints drawn")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Hand skeleton test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_undo_history():
+    """Test that undo/redo restore each stroke exactly."""
+    print("\n🔍 Testing undo/redo history...")
+    
+    try:
+        import tempfile
+        from canvas_manager import CanvasManager
+        
+        canvas = CanvasManager(640, 480)
+        canvas.set_drawing_mode()
+        snapshots = [canvas.get_canvas()]
+        
+        # Draw three separate strokes
+        for i in range(3):
+            for point in [(100 + i * 150, 150), (150 + i * 150, 250), (120 + i * 150, 400)]:
+                canvas.update_drawing(point)
+            canvas.update_drawing(None)
+            snapshots.append(canvas.get_canvas())
+        
+        for expected in reversed(snapshots[:-1]):
+            if not canvas.undo() or not (canvas.get_canvas() == expected).all():
+                print("❌ Undo did not restore the previous stroke")
+                return False
+        
+        if canvas.undo():
+            print("❌ Undo succeeded past the first stroke")
+            return False
+        
+        for expected in snapshots[1:]:
+            if not canvas.redo() or not (canvas.get_canvas() == expected).all():
+                print("❌ Redo did not reapply the stroke")
+                return False
+        
+        # Past the budget, old strokes are flattened between strokes: history
+        # stays bounded and undo redraws at most the budgeted strokes, with the
+        # canvas unchanged and every stroke still saved as vectors
+        limited = CanvasManager(640, 480, max_strokes=8)
+        unlimited = CanvasManager(640, 480, max_strokes=1000)
+        memory = []
+        for i in range(40):
+            for c in (limited, unlimited):
+                c.set_eraser(True) if i % 5 == 4 else c.set_drawing_mode()
+                for point in [(20 + i * 15, 100 + i * 5), (200 + i * 5, 300), (600 - i * 10, 450 - i * 3)]:
+                    c.update_drawing(point)
+                c.update_drawing(None)
+                c.compact_history()
+            memory.append(limited.strokes.memory_used())
+        
+        full = (0, 0, limited.master_width, limited.master_height)
+        if (len(limited.strokes) > 8 or len(limited.strokes.query(full)) > 8 or
+                max(memory) > 2 * memory[8] or not (limited.canvas == unlimited.canvas).all()):
+            print(f"❌ Stroke budget not kept: {len(limited.strokes)} strokes, "
+                  f"{max(memory):,} bytes of history")
+            return False
+        directory = tempfile.mkdtemp()
+        svg_path = limited.save_drawing(os.path.join(directory, "limited.svg"))
+        npz_path = limited.save_drawing(os.path.join(directory, "limited.npz"))
+        with open(svg_path) as f:
+            svg = f.read()
+        reloaded = CanvasManager(640, 480)
+        if ('<image' in svg or svg.count('<polyline') != 40 or not reloaded.load_drawing(npz_path) or
+                not (reloaded.canvas == unlimited.canvas).all()):
+            print("❌ Flattened strokes were not saved as vectors")
+            return False
+        undone = 0
+        while limited.undo():
+            unlimited.undo()
+            undone += 1
+        if undone != limited.strokes.count or not (limited.canvas == unlimited.canvas).all():
+            print("❌ Undo past flattened strokes did not match the unlimited history")
+            return False
+        
+        print(f"✅ {len(canvas.strokes)} strokes in {canvas.strokes.memory_used():,} bytes of history; "
+              f"{undone} undoable of 40 within the budget")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Undo history test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_stroke_export():
+    """Test that strokes saved as .npz reload exactly and export as SVG."""
+    print("\n🔍 Testing stroke export...")
+    
+    try:
+        import tempfile
+        import xml.dom.minidom
+        from canvas_manager import CanvasManager
+        
+        canvas = CanvasManager(640, 480)
+        canvas.set_drawing_mode()
+        for point in [(50, 60), (300, 200), (600, 420)]:
+            canvas.update_drawing(point)
+        canvas.update_drawing(None)
+        canvas.set_eraser(True)
+        for point in [(100, 100), (400, 300)]:
+            canvas.update_drawing(point)
+        canvas.update_drawing(None)
+        
+        path = os.path.join(tempfile.mkdtemp(), "drawing.npz")
+        canvas.strokes.save(path, canvas.master_width, canvas.master_height)
+        loaded = CanvasManager(640, 480)
+        if not loaded.load_drawing(path) or not (loaded.get_canvas() == canvas.get_canvas()).all():
+            print("❌ Reloaded strokes do not match the canvas")
+            return False
+        
+        svg = canvas.strokes.to_svg(canvas.master_width, canvas.master_height)
+        xml.dom.minidom.parseString(svg)
+        if svg.count('<polyline') != 2 or 'mask=' not in svg:
+            print("❌ SVG is missing strokes or the eraser mask")
+            return False
+        
+        print(f"✅ {len(loaded.strokes)} strokes reloaded from {os.path.getsize(path):,} bytes")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Stroke export test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_session_replay():
+    """Test that a recorded session replays its frames, landmarks and keys."""
+    print("\n🔍 Testing session record/replay...")
+    
+    try:
+        import tempfile
+        import numpy as np
+        from session_recorder import SessionRecorder, SessionPlayer, NO_KEY
+        
+        path = os.path.join(tempfile.mkdtemp(), "session.vps")
+        frames = [np.full((48, 64, 3), i * 40, np.uint8) for i in range(5)]
+        landmarks = [np.full((i % 3, 21, 3), i, np.float32) for i in range(5)]
+        keys = [NO_KEY, ord('z'), NO_KEY, NO_KEY, ord('q')]
+        
+        recorder = SessionRecorder(path, frames[0].shape, frame_format=".png")
+        for i in range(5):
+            recorder.write(frames[i], landmarks[i], keys[i], timestamp=i / 30)
+        recorder.close()
+        
+        # Frames are stored encoded, not as raw pixels
+        raw_bytes = sum(frame.nbytes for frame in frames)
+        if os.path.getsize(path) >= raw_bytes:
+            print(f"❌ Session takes {os.path.getsize(path):,} bytes, more than the raw frames")
+            return False
+        
+        player = SessionPlayer(path)
+        for i in range(5):
+            success, frame = player.read()
+            if (not success or not (frame == frames[i]).all() or
+                    not np.array_equal(player.landmarks, landmarks[i]) or player.key != keys[i]):
+                print(f"❌ Frame {i} did not replay as recorded")
+                return False
+        
+        if player.read()[0]:
+            print("❌ Replay continued past the recorded frames")
+            return False
+        player.release()
+        
+        print(f"✅ {player.frame_count} frames replayed from {os.path.getsize(path):,} bytes")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Session replay test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_frame_sources():
+    """Test that frame sources decode into one reused buffer."""
+    print("\n🔍 Testing frame sources...")
+    
+    try:
+        import tempfile
+        import cv2
+        import numpy as np
+        from frame_source import FrameSource, open_frame_source
+        from inference_worker import SharedFrameRing
+        
+        directory = tempfile.mkdtemp()
+        for i in range(3):
+            cv2.imwrite(os.path.join(directory, f"{i}.png"), np.full((48, 64, 3), i * 50, np.uint8))
+        
+        for spec, count in [("synthetic:5", 5), (f"images:{directory}", 3)]:
+            source = open_frame_source(spec)
+            buffers = set()
+            for i in range(count):
+                success, frame = source.read()
+                if not success:
+                    print(f"❌ {spec} stopped after {i} frames")
+                    return False
+                buffers.add(frame.ctypes.data)
+            if source.read()[0]:
+                print(f"❌ {spec} returned more than {count} frames")
+                return False
+            if len(buffers) != 1:
+                print(f"❌ {spec} allocated {len(buffers)} frame buffers")
+                return False
+            source.release()
+        
+        # Incomplete sources fail when created, not on the first read
+        class IncompleteSource(FrameSource):
+            pass
+        try:
+            IncompleteSource()
+            print("❌ A source without _read_into could be created")
+            return False
+        except TypeError:
+            pass
+        
+        # A one-slot ring could never be read consistently
+        try:
+            SharedFrameRing(1, (48, 64, 3)).close()
+            print("❌ Created a shared-memory ring with one slot")
+            return False
+        except ValueError:
+            pass
+        
+        # Attaching to a shared-memory ring takes its layout from the header
+        ring = SharedFrameRing(2, (48, 64, 3))
+        ring.publish(np.full((48, 64, 3), 7, np.uint8))
+        source = open_frame_source(f"shm:{ring.name}")
+        success, frame = source.read()
+        source.release()
+        try:
+            SharedFrameRing(3, (48, 64, 3), name=ring.name)
+            print("❌ Attached to a ring with the wrong number of slots")
+            return False
+        except ValueError:
+            pass
+        finally:
+            ring.close()
+        if not success or source.ring.max_shape != (48, 64, 3) or not (frame == 7).all():
+            print("❌ Shared-memory source did not read the ring's layout")
+            return False
+        
+        print("✅ Synthetic and image directory sources reuse their frame buffer")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Frame source test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_steady_state_allocation():
+    """Test that a steady-state frame allocates nothing frame-sized, drawing or erasing."""
+    print("\n🔍 Testing steady-state allocation...")
+    
+    try:
+        import tracemalloc
+        import numpy as np
+        from config import CAMERA_WIDTH, CAMERA_HEIGHT
+        from buffer_pool import BufferPool
+        from frame_source import SyntheticSource
+        from hand_tracker import HandTracker
+        from canvas_manager import CanvasManager
+        from ui_manager import UIManager
+        
+        buffers = BufferPool(CAMERA_WIDTH, CAMERA_HEIGHT)
+        source = SyntheticSource(CAMERA_WIDTH, CAMERA_HEIGHT)
+        hand_tracker = HandTracker(use_process=False, buffers=buffers)
+        canvas = CanvasManager(CAMERA_WIDTH, CAMERA_HEIGHT, buffers)
+        ui = UIManager(CAMERA_WIDTH, CAMERA_HEIGHT)
+        
+        def run_frame(i):
+            # A hand sweeping across the frame, tens of pixels per frame
+            t = i * 0.15
+            x = CAMERA_WIDTH * (0.5 + 0.4 * np.sin(t))
+            y = CAMERA_HEIGHT * (0.55 + 0.35 * np.sin(2 * t + 0.5))
+            hand = np.zeros((1, 21, 3), np.float32)
+            hand[..., 0], hand[..., 1] = x, y
+            
+            success, frame = source.read()
+            # Landmarks are given, as in a replay: MediaPipe's own result
+            # objects (about 16 KB per call) are outside this pipeline
+            frame = hand_tracker.process_frame(frame, hand)
+            hand_tracker.draw_landmarks(frame)
+            canvas.update_drawing(hand_tracker.get_index_tip(hand_tracker.landmarks[0]))
+            canvas.get_canvas_overlay(frame)
+            ui.draw_ui_layer(frame, canvas.get_drawing_info())
+            canvas.get_display_canvas()
+        
+        worst = {}
+        for mode, set_mode in [("drawing", canvas.set_drawing_mode), ("erasing", canvas.set_eraser)]:
+            set_mode()
+            # Warm up, then measure the peak extra memory of each frame
+            for i in range(10):
+                run_frame(i)
+            allocations = buffers.allocations
+            
+            tracemalloc.start()
+            worst[mode] = 0
+            for i in range(10, 40):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                run_frame(i)
+                worst[mode] = max(worst[mode], tracemalloc.get_traced_memory()[1] - before)
+            tracemalloc.stop()
+            
+            # What remains is a few KB of Python objects per frame (point tuples,
+            # the drawing info dict, hand results) that does not grow with the
+            # frame size or stroke length; one frame-sized buffer is over 1 MB
+            limit = 4 * 1024
+            if worst[mode] > limit or buffers.allocations != allocations:
+                print(f"❌ Steady-state {mode} frame allocated {worst[mode]:,} bytes "
+                      f"({buffers.allocations - allocations} new pool buffers)")
+                return False
+        hand_tracker.release()
+        
+        print(f"✅ Steady-state frames allocate at most {worst['drawing']:,} bytes drawing, "
+              f"{worst['erasing']:,} erasing")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Allocation test failed: {e}")
+        traceback.print_exc()
+        return False
+
 def main():
     """Main test function."""
     print("🧪 Enhanced Virtual Painter - Setup Test")
@@ -173,7 +533,13 @@ def main():
         ("Module Imports", test_imports),
         ("Configuration", test_config),
         ("Class Instantiation", test_classes),
-        ("Basic Functionality", test_basic_functionality)
+        ("Basic Functionality", test_basic_functionality),
+        ("Hand Skeleton", test_hand_skeleton),
+        ("Undo History", test_undo_history),
+        ("Stroke Export", test_stroke_export),
+        ("Session Replay", test_session_replay),
+        ("Frame Sources", test_frame_sources),
+        ("Steady-State Allocation", test_steady_state_allocation)
     ]
     
     passed = 0
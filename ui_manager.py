@@ -17,10 +17,22 @@ class UIManager:
         self.show_brush_sizes = False
         self.show_help = False
         self.show_info = False
+        self.show_latency = False
         
         # Create color buttons
         self.color_buttons = self._create_color_buttons()
         self.brush_size_buttons = self._create_brush_size_buttons()
+        self.small_brush_size_buttons = [cv2.resize(button, (20, 15))
+                                         for button in self.brush_size_buttons]
+        
+        # Retained UI layer, rebuilt only when the state it shows changes
+        self._ui_layer = []
+        self._ui_layer_key = None
+        
+        # Pre-rendered overlay text lines, keyed by (line index, text)
+        self._help_lines = {}
+        self._info_lines = {}
+        self._latency_cells = {}
     
     def _create_color_buttons(self):
         """Create color button images."""
@@ -73,6 +85,17 @@ class UIManager:
     def draw_header(self, frame):
         """Draw the header with color selection buttons."""
         # Draw color buttons
+        self._draw_color_buttons(frame)
+        
+        # Draw brush size selector
+        if self.show_brush_sizes:
+            self._draw_brush_size_selector(frame)
+        
+        # Draw mode indicator
+        self._draw_mode_indicator(frame)
+    
+    def _draw_color_buttons(self, frame):
+        """Draw the color buttons and highlight the selected one."""
         for i in range(self.num_colors):
             x1 = i * self.button_width
             x2 = (i + 1) * self.button_width
@@ -84,13 +107,129 @@ class UIManager:
             if i == self.selected_color_idx:
                 cv2.rectangle(frame, (x1, 0), (x2, BUTTON_HEIGHT), 
                              SELECTION_BORDER_COLOR, SELECTION_BORDER_THICKNESS)
+    
+    def draw_ui_layer(self, frame, canvas_info):
+        """Draw the header, brush panel and mode status from the cached UI layer."""
+        key = (self.selected_color_idx, self.selected_brush_size_idx, self.show_brush_sizes,
+               self.show_help, self.show_info, canvas_info.get('current_mode'),
+               canvas_info.get('current_brush_size'), canvas_info.get('is_erasing'))
+        if key != self._ui_layer_key:
+            self._build_ui_layer(canvas_info)
+            self._ui_layer_key = key
         
-        # Draw brush size selector
+        for patch in self._ui_layer:
+            self._blit_patch(frame, patch)
+    
+    def _blit_patch(self, frame, patch):
+        """Copy or blend the parts of a pre-rendered patch into the frame in place."""
+        for x1, y1, x2, y2, color, mask, inv_alpha in patch:
+            # Frames smaller than the UI layout only show the part of the patch that fits
+            h, w = min(y2, frame.shape[0]) - y1, min(x2, frame.shape[1]) - x1
+            if h <= 0 or w <= 0:
+                continue
+            if (h, w) != color.shape[:2]:
+                color = color[:h, :w]
+                mask = mask[:h, :w] if mask is not None else None
+                inv_alpha = inv_alpha[:h, :w] if inv_alpha is not None else None
+            
+            roi = frame[y1:y1 + h, x1:x1 + w]
+            if inv_alpha is not None:
+                # roi = color + roi * (1 - alpha), keeping anti-aliased edges
+                cv2.multiply(roi, inv_alpha, dst=roi, scale=1.0 / 255)
+                cv2.add(roi, color, dst=roi)
+            elif mask is not None:
+                cv2.copyTo(color, mask, roi)
+            else:
+                roi[...] = color
+    
+    def _build_ui_layer(self, canvas_info):
+        """Render each UI element once into a cropped patch with its mask."""
+        elements = [self._draw_color_buttons, self._draw_mode_indicator,
+                    lambda frame: self.draw_mode_status(frame, canvas_info)]
         if self.show_brush_sizes:
-            self._draw_brush_size_selector(frame)
+            elements.insert(1, self._draw_brush_size_selector)
         
-        # Draw mode indicator
-        self._draw_mode_indicator(frame)
+        self._ui_layer = []
+        for draw in elements:
+            patch = self._render_patch(draw)
+            if patch is not None:
+                self._ui_layer.append(patch)
+    
+    def _render_patch(self, draw, origin=(0, 0), size=None):
+        """Capture what a draw function paints as a list of (x1, y1, x2, y2, color, mask, inv_alpha).
+        
+        draw is called on images of the given size (default: the whole UI) whose
+        top-left corner sits at origin in frame coordinates. Opaque pixels come
+        as one part copied through mask (None when all of it is opaque), and
+        partly covered ones as a part blended with inv_alpha, cropped to them,
+        so untouched pixels around the UI cost nothing.
+        """
+        width, height = size if size else (self.width, self.height)
+        
+        # Drawn over black, a pixel is its premultiplied color; drawn over white,
+        # the difference from the black render is the background left showing
+        dark = np.zeros((height, width, 3), np.uint8)
+        light = np.full((height, width, 3), 255, np.uint8)
+        draw(dark)
+        draw(light)
+        inv_alpha = cv2.subtract(light, dark)
+        
+        # Pixels are opaque where no background shows in any channel, and
+        # partly covered where some but not all of it does
+        b, g, r = cv2.split(inv_alpha)
+        inv_max, inv_min = cv2.max(cv2.max(b, g), r), cv2.min(cv2.min(b, g), r)
+        opaque = cv2.compare(inv_max, 0, cv2.CMP_EQ)
+        partial = cv2.bitwise_and(cv2.compare(inv_max, 0, cv2.CMP_GT), cv2.compare(inv_min, 255, cv2.CMP_LT))
+        
+        parts = []
+        x, y, w, h = cv2.boundingRect(opaque)
+        if w and h:
+            mask = opaque[y:y + h, x:x + w]
+            mask = None if cv2.countNonZero(mask) == w * h else mask.copy()
+            parts.append((x + origin[0], y + origin[1], x + w + origin[0], y + h + origin[1],
+                          dark[y:y + h, x:x + w].copy(), mask, None))
+        x, y, w, h = cv2.boundingRect(partial)
+        if w and h:
+            parts.append((x + origin[0], y + origin[1], x + w + origin[0], y + h + origin[1],
+                          dark[y:y + h, x:x + w].copy(), None, inv_alpha[y:y + h, x:x + w].copy()))
+        return parts or None
+    
+    def _draw_text_overlay(self, frame, lines, cache):
+        """Darken the frame in place and blend cached text lines over it."""
+        # Same as blending 70% black over the UI area
+        roi = frame[:self.height, :self.width]
+        cv2.convertScaleAbs(roi, dst=roi, alpha=0.3)
+        
+        y_start = 60
+        for i, text in enumerate(lines):
+            if not text:
+                continue
+            
+            patch = cache.get((i, text))
+            if patch is None:
+                # Only lines whose text changed are rendered again
+                if len(cache) > 4 * len(lines):
+                    cache.clear()
+                patch = self._render_text_line(text, (30, y_start + i * 20), i == 0)
+                cache[(i, text)] = patch
+            
+            if patch is not None:
+                self._blit_patch(frame, patch)
+    
+    def _render_text_line(self, text, position, is_title):
+        """Render one overlay text line into a patch."""
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        color = (255, 255, 0) if is_title else (255, 255, 255)
+        thickness = 2 if is_title else 1
+        (text_width, text_height), baseline = cv2.getTextSize(text, font, 0.4, thickness)
+        
+        pad = thickness + 2
+        x, y = position[0] - pad, position[1] - text_height - pad
+        size = (text_width + 2 * pad, text_height + baseline + 2 * pad)
+        return self._render_patch(
+            lambda img: cv2.putText(img, text, (pad, text_height + pad), font, 0.4,
+                                    color, thickness),
+            origin=(x, y), size=size)
     
     def _draw_brush_size_selector(self, frame):
         """Draw brush size selection panel."""
@@ -108,11 +247,9 @@ class UIManager:
                    0.4, (255, 255, 255), 1)
         
         # Brush size buttons (show fewer buttons to fit)
-        for i, button in enumerate(self.brush_size_buttons[:6]):  # Show only first 6 sizes
+        for i, small_button in enumerate(self.small_brush_size_buttons[:6]):  # Show only first 6 sizes
             bx = x + 10 + i * 25
             by = y + 15
-            # Scale down the button
-            small_button = cv2.resize(button, (20, 15))
             frame[by:by+15, bx:bx+20] = small_button
             
             # Highlight selected size
@@ -139,11 +276,6 @@ class UIManager:
         if not self.show_help:
             return frame
         
-        # Semi-transparent overlay
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (self.width, self.height), (0, 0, 0), -1)
-        frame = cv2.addWeighted(frame, 0.3, overlay, 0.7, 0)
-        
         # Help text
         help_text = [
             "VIRTUAL PAINTER - HELP",
@@ -169,19 +301,14 @@ class UIManager:
             "• 'E': Toggle eraser mode",
             "• 'H': Toggle help",
             "• 'I': Show info",
+            "• 'P': Toggle latency panel",
             "• 'Q': Quit",
             "",
             "Press 'H' to close help"
         ]
         
-        y_start = 60
-        for i, text in enumerate(help_text):
-            y = y_start + i * 20
-            color = (255, 255, 0) if i == 0 else (255, 255, 255)
-            thickness = 2 if i == 0 else 1
-            cv2.putText(frame, text, (30, y), cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.4, color, thickness)
-        
+        # Semi-transparent overlay with pre-rendered text, blended in place
+        self._draw_text_overlay(frame, help_text, self._help_lines)
         return frame
     
     def draw_info_overlay(self, frame, canvas_info):
@@ -189,11 +316,6 @@ class UIManager:
         if not self.show_info:
             return frame
         
-        # Semi-transparent overlay
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (self.width, self.height), (0, 0, 0), -1)
-        frame = cv2.addWeighted(frame, 0.3, overlay, 0.7, 0)
-        
         # Info text
         info_text = [
             "DRAWING INFORMATION",
@@ -213,14 +335,33 @@ class UIManager:
             "Press 'I' to close info"
         ]
         
-        y_start = 60
-        for i, text in enumerate(info_text):
-            y = y_start + i * 20
-            color = (255, 255, 0) if i == 0 else (255, 255, 255)
-            thickness = 2 if i == 0 else 1
-            cv2.putText(frame, text, (30, y), cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.4, color, thickness)
+        # Semi-transparent overlay with pre-rendered text, blended in place
+        self._draw_text_overlay(frame, info_text, self._info_lines)
+        return frame
+    
+    def draw_latency_overlay(self, frame, rows):
+        """Draw a panel of (stage, p50, p95, p99) latency rows in place."""
+        columns = (0, 110, 165, 220)
+        x = max(self.width - 290, 0)
+        y = BUTTON_HEIGHT + 60
+        roi = frame[y:y + 40 + len(rows) * 18, x:x + 280]
+        cv2.convertScaleAbs(roi, dst=roi, alpha=0.3)
         
+        cells = [("LATENCY (ms)", 0, 0, True)]
+        for i, row in enumerate(rows):
+            cells.extend((text, i + 1, column, False) for text, column in zip(row, columns))
+        
+        for text, i, column, is_title in cells:
+            key = (i, column, text)
+            patch = self._latency_cells.get(key)
+            if patch is None:
+                # Values change every refresh, so keep the cache from growing
+                if len(self._latency_cells) > 8 * len(cells):
+                    self._latency_cells.clear()
+                patch = self._render_text_line(text, (x + 10 + column, y + 20 + i * 18), is_title)
+                self._latency_cells[key] = patch
+            if patch is not None:
+                self._blit_patch(frame, patch)
         return frame
     
     def get_color_name(self, index):
@@ -273,6 +414,10 @@ class UIManager:
         if self.show_help:
             self.show_info = False
     
+    def toggle_latency(self):
+        """Toggle the latency panel."""
+        self.show_latency = not self.show_latency
+    
     def toggle_info(self):
         """Toggle info overlay visibility."""
         self.show_info = not self.show_info
@@ -0,0 +1,78 @@
+import os
+import queue
+import threading
+import cv2
+import numpy as np
+from config import *
+
+class BackgroundVideoWriter:
+    def __init__(self, path, fps=30.0, fourcc=OUTPUT_FOURCC, queue_size=OUTPUT_QUEUE_SIZE):
+        """Initialize a video file writer that encodes on a background thread.
+
+        Frames are copied into a fixed set of reused slots, so write() returns
+        as soon as the copy is done; it only waits when the encoder has fallen
+        queue_size frames behind. No frame is ever dropped. The file is opened
+        on the first write, at that frame's size.
+        """
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+        self._queue = queue.Queue(queue_size)
+        self._slots = [None] * (queue_size + 1)
+        self._free = queue.SimpleQueue()
+        for slot in range(queue_size + 1):
+            self._free.put(slot)
+        self._thread = None
+        self.error = None
+        self.frames_written = 0
+
+    def _open(self, frame):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        height, width = frame.shape[:2]
+        self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                      self.fps, (width, height))
+        if not self.writer.isOpened():
+            raise OSError(f"Could not open video writer: {self.path}")
+        self._thread = threading.Thread(target=self._write_loop, name="VideoWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        """Queue a copy of frame for encoding, waiting only while the queue is full."""
+        if self.error:
+            raise OSError(f"Error writing {self.path}: {self.error}")
+        if self.writer is None:
+            self._open(frame)
+
+        slot = self._free.get()
+        buffer = self._slots[slot]
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = self._slots[slot] = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        self._queue.put(slot)
+
+    def _write_loop(self):
+        """Encode queued frames until close() sends None."""
+        while True:
+            slot = self._queue.get()
+            if slot is None:
+                break
+            try:
+                self.writer.write(self._slots[slot])
+                self.frames_written += 1
+            except cv2.error as e:
+                self.error = e
+            self._free.put(slot)
+
+    def close(self):
+        """Encode the frames still queued and close the file."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
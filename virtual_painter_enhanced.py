@@ -1,4 +1,5 @@
 
+import argparse
 import cv2
 import time
 import os
@@ -7,54 +8,116 @@ from datetime import datetime
 
 # Import our custom modules
 from config import *
-from hand_tracker import HandTracker
+from hand_tracker import HandTracker, GESTURE_SELECTION, GESTURE_DRAWING, GESTURE_ERASER
 from canvas_manager import CanvasManager
 from ui_manager import UIManager
+from frame_capture import FrameGrabber
+from frame_display import FrameDisplay
+from frame_source import open_frame_source, CameraSource
+from frame_pacer import FramePacer
+from buffer_pool import BufferPool
+from latency_monitor import LatencyMonitor
+from session_recorder import SessionRecorder, SessionPlayer, NO_KEY
+from video_writer import BackgroundVideoWriter
 
 class VirtualPainter:
-    def __init__(self):
-        """Initialize the Virtual Painter application."""
+    def __init__(self, source=FRAME_SOURCE, record_path=None, replay_path=None, realtime=False,
+                 headless=False, replay_inference=False, metrics_path=LATENCY_EXPORT_PATH,
+                 output_path=None, hand_tracker=None, player=None, canvas_size=None,
+                 target_fps=None):
+        """Initialize the Virtual Painter application.
+        
+        Frames come from the source spec (see open_frame_source). A session can
+        be recorded to record_path, or replayed from replay_path instead - at
+        its recorded speed with realtime, otherwise as fast as possible. Replays
+        use the recorded landmarks unless replay_inference is set. Headless runs
+        open no windows. Stage latencies are exported to metrics_path if given.
+        
+        With output_path, the input is rendered to a video file as fast as it
+        can be processed, headless, and the final canvas saved alongside it.
+        
+        A hand_tracker can be passed in to reuse one (and its loaded model)
+        across painters; it is reset here and left open by cleanup().
+        
+        An already opened player - any frame source that also sets landmarks
+        and key for each frame, such as a SessionPlayer - can be replayed in
+        place of replay_path, e.g. by benchmarks with a generated session.
+        The canvas and UI are laid out at canvas_size (width, height), by
+        default CANVAS_WIDTH x CANVAS_HEIGHT.
+        
+        Frames are paced to target_fps, 0 for uncapped. By default live
+        sources run at TARGET_FPS and replays and renders uncapped.
+        """
         self.cap = None
-        self.hand_tracker = None
+        self.frame_grabber = None
+        self.display = None
+        replaying = replay_path or player is not None
+        if target_fps is None:
+            target_fps = 0 if replaying or output_path else TARGET_FPS
+        self.frame_pacer = FramePacer(target_fps)
+        self.record_path = record_path
+        self.recorder = None
+        self.player = None
+        self.replay_inference = replay_inference
+        self.headless = headless or bool(output_path)
+        self.output_path = output_path
+        self.writer = None
+        self.latency = LatencyMonitor(export_path=metrics_path, enabled=LATENCY_TRACKING)
+        self.buffers = None
+        self.hand_tracker = hand_tracker
+        self.owns_hand_tracker = hand_tracker is None
         self.canvas_manager = None
         self.ui_manager = None
+        self.canvas_size = canvas_size or (CANVAS_WIDTH, CANVAS_HEIGHT)
         
         # Application state
         self.running = False
+        self.error = None  # Exception that ended the main loop, if any
         self.selection_cooldown = 0
         self.current_mode = ""
         self.last_fps_time = 0
+        self.start_time = 0
         self.frame_count = 0
+        self._latency_panel_time = 0  # When the latency panel rows were last refreshed
+        self._latency_rows = []
         
         # Initialize components
-        self._initialize_camera()
+        if replaying:
+            self._initialize_replay(player or SessionPlayer(replay_path, realtime), replay_path)
+        else:
+            self._initialize_source(source)
+        if output_path:
+            fps = self.cap.fps or TARGET_FPS or 30
+            self.writer = BackgroundVideoWriter(output_path, fps)
         self._initialize_components()
         
-    def _initialize_camera(self):
-        """Initialize the camera."""
-        try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                print("Error: Could not open camera.")
-                sys.exit(1)
-            
-            # Set camera properties
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-            self.cap.set(cv2.CAP_PROP_BRIGHTNESS, CAMERA_BRIGHTNESS)
-            
+    def _initialize_replay(self, player, path=None):
+        """Replay a recorded session in place of the camera."""
+        self.player = player
+        self.cap = self.player
+        print(f"Replaying {self.player.frame_count} frames from {path or type(player).__name__}")
+    
+    def _initialize_source(self, spec):
+        """Open the frame source, raising OSError if it is unavailable."""
+        self.cap = open_frame_source(spec)
+        if isinstance(self.cap, CameraSource):
             print(f"Camera initialized: {CAMERA_WIDTH}x{CAMERA_HEIGHT}")
-            
-        except Exception as e:
-            print(f"Error initializing camera: {e}")
-            sys.exit(1)
+        else:
+            print(f"Frame source initialized: {spec}")
     
     def _initialize_components(self):
         """Initialize all application components."""
         try:
-            self.hand_tracker = HandTracker()
-            self.canvas_manager = CanvasManager(CANVAS_WIDTH, CANVAS_HEIGHT)
-            self.ui_manager = UIManager(CANVAS_WIDTH, CANVAS_HEIGHT)
+            # Per-frame scratch buffers shared by the pipeline stages
+            if self.owns_hand_tracker:
+                self.buffers = BufferPool(CAMERA_WIDTH, CAMERA_HEIGHT)
+                self.hand_tracker = HandTracker(buffers=self.buffers, latency=self.latency)
+            else:
+                self.hand_tracker.reset()
+                self.hand_tracker.latency = self.latency
+                self.buffers = self.hand_tracker.buffers
+            self.canvas_manager = CanvasManager(*self.canvas_size, self.buffers)
+            self.ui_manager = UIManager(*self.canvas_size)
             
             print("All components initialized successfully.")
             
@@ -95,30 +158,29 @@ class VirtualPainter:
             self.ui_manager.toggle_help()
         elif key == ord('i'):
             self.ui_manager.toggle_info()
+        elif key == ord('p'):
+            self.ui_manager.toggle_latency()
     
     def _process_hand_gestures(self, frame):
         """Process hand gestures and update application state."""
-        if not self.hand_tracker.landmarks:
+        if not self.hand_tracker.hand_results:
             if self.current_mode != "":
                 self.current_mode = ""
                 self.canvas_manager.set_idle_mode()
                 self.canvas_manager.reset_drawing_state()
             return
         
-        # Process first hand (for simplicity)
-        landmarks = self.hand_tracker.landmarks[0]
+        # Process first hand (for simplicity); gestures were classified once per frame
+        hand = self.hand_tracker.hand_results[0]
         
         # Get finger positions
-        index_tip = self.hand_tracker.get_index_tip(landmarks)
-        middle_tip = self.hand_tracker.get_middle_tip(landmarks)
-        
-        if not index_tip:
-            return
+        index_tip = hand.index_tip
+        middle_tip = hand.middle_tip
         
         x, y = index_tip
         
         # Handle selection mode (index + middle up)
-        if (self.hand_tracker.is_selection_gesture(landmarks) and 
+        if (hand.gesture == GESTURE_SELECTION and 
             self.selection_cooldown == 0):
             
             # Switch to selection mode
@@ -148,7 +210,7 @@ class VirtualPainter:
                              self.canvas_manager.current_color, cv2.FILLED)
         
         # Handle drawing mode (only index up)
-        elif self.hand_tracker.is_drawing_gesture(landmarks) and y > DRAWING_THRESHOLD:
+        elif hand.gesture == GESTURE_DRAWING and y > DRAWING_THRESHOLD:
             # Switch to drawing mode
             if self.current_mode != "Drawing Mode":
                 self.current_mode = "Drawing Mode"
@@ -156,10 +218,10 @@ class VirtualPainter:
                 self.canvas_manager.reset_drawing_state()
                 print("Mode: Drawing Mode")
             
-            self.canvas_manager.update_drawing(index_tip)
+            self._update_canvas(index_tip)
         
         # Handle eraser mode (fist)
-        elif self.hand_tracker.is_eraser_gesture(landmarks) and y > DRAWING_THRESHOLD:
+        elif hand.gesture == GESTURE_ERASER and y > DRAWING_THRESHOLD:
             # Switch to eraser mode
             if self.current_mode != "Eraser Mode":
                 self.current_mode = "Eraser Mode"
@@ -167,7 +229,7 @@ class VirtualPainter:
                 self.canvas_manager.reset_drawing_state()
                 print("Mode: Eraser Mode")
             
-            self.canvas_manager.update_drawing(index_tip)
+            self._update_canvas(index_tip)
         
         else:
             # No specific gesture detected
@@ -180,13 +242,19 @@ class VirtualPainter:
         if self.selection_cooldown > 0:
             self.selection_cooldown -= 1
     
+    def _update_canvas(self, point):
+        """Continue the stroke to point, timed as its own stage."""
+        self.latency.lap('gestures')
+        self.canvas_manager.update_drawing(point)
+        self.latency.lap('canvas')
+    
     def _draw_ui_elements(self, frame):
         """Draw all UI elements on the frame."""
-        # Draw header with color selection
-        self.ui_manager.draw_header(frame)
+        canvas_info = self.canvas_manager.get_drawing_info()
         
-        # Draw mode status (new detailed mode indicator)
-        self.ui_manager.draw_mode_status(frame, self.canvas_manager.get_drawing_info())
+        # Draw header with color selection and the detailed mode status,
+        # blitted from the cached UI layer
+        self.ui_manager.draw_ui_layer(frame, canvas_info)
         
         # Draw mode text (legacy, can be removed later)
         if SHOW_MODE_TEXT and self.current_mode:
@@ -199,7 +267,17 @@ class VirtualPainter:
         
         # Draw overlays
         self.ui_manager.draw_help_overlay(frame)
-        self.ui_manager.draw_info_overlay(frame, self.canvas_manager.get_drawing_info())
+        self.ui_manager.draw_info_overlay(frame, canvas_info)
+        if self.ui_manager.show_latency:
+            self._draw_latency_panel(frame)
+    
+    def _draw_latency_panel(self, frame):
+        """Draw the per-stage latency percentiles, refreshed once a second."""
+        now = time.time()
+        if now - self._latency_panel_time >= 1.0:
+            self._latency_panel_time = now
+            self._latency_rows = self.latency.format_rows()
+        self.ui_manager.draw_latency_overlay(frame, self._latency_rows)
     
     def _draw_fps(self, frame):
         """Draw FPS counter."""
@@ -226,45 +304,99 @@ class VirtualPainter:
         
         self.running = True
         self.last_fps_time = time.time()
+        self.start_time = time.perf_counter()
+        
+        # Capture on a background thread so the loop always gets the newest frame
+        # (files and generators are read in full, frame by frame)
+        if THREADED_CAPTURE and isinstance(self.cap, CameraSource):
+            self.frame_grabber = FrameGrabber(self.cap).start()
+        source = self.frame_grabber if self.frame_grabber else self.cap
+        if not self.headless:
+            self.display = FrameDisplay().start()
+        self.frame_pacer.reset()
         
         try:
             while self.running:
+                self.latency.begin_frame()
+                
                 # Read frame
-                success, frame = self.cap.read()
+                success, frame = source.read()
                 if not success:
-                    print("Error reading frame.")
+                    if isinstance(self.cap, CameraSource):
+                        print("Error reading frame.")
+                    else:
+                        print("Replay finished." if self.player is not None else "End of input.")
                     break
+                frame_time = time.perf_counter()
+                captured = frame
+                self.latency.lap('capture')
+                
+                # Process hand tracking (replays reuse the recorded landmarks)
+                landmarks = None
+                if self.player is not None and not self.replay_inference:
+                    landmarks = self.player.landmarks
+                frame = self.hand_tracker.process_frame(frame, landmarks)
                 
-                # Process hand tracking
-                frame = self.hand_tracker.process_frame(frame)
+                # Render the hand skeleton, if anyone is looking at it
+                if DRAW_HAND_SKELETON:
+                    self.hand_tracker.draw_landmarks(frame)
+                    self.latency.lap('skeleton')
                 
-                # Process gestures
-                self._process_hand_gestures(frame)
+                # Process gestures (nothing to do while the tracker idles on a static scene)
+                if not self.hand_tracker.gated:
+                    self._process_hand_gestures(frame)
+                    self.latency.lap('gestures')
+                
+                # Flatten a little of the undo history if it has grown past its budget
+                self.canvas_manager.compact_history()
+                self.latency.lap('canvas')
                 
                 # Apply canvas overlay
                 frame = self.canvas_manager.get_canvas_overlay(frame)
+                self.latency.lap('compositing')
                 
                 # Draw UI elements
                 self._draw_ui_elements(frame)
+                self.latency.lap('ui')
+                
+                if self.writer:
+                    self.writer.write(frame)
+                    self.latency.lap('output')
                 
-                # Show windows
-                cv2.imshow('Virtual Painter', frame)
-                cv2.imshow('Canvas', self.canvas_manager.get_canvas())
+                # Hand the frame to the display (the Canvas window only when it changed)
+                key = NO_KEY
+                if self.display:
+                    canvas = None
+                    version = self.canvas_manager.version
+                    if self.display.canvas_due(version):
+                        canvas = self.canvas_manager.get_display_canvas()
+                    self.display.show(frame, canvas, version)
+                    key = self.display.get_key()
+                    self.latency.lap('display')
+                if key == NO_KEY and self.player is not None:
+                    key = self.player.key
+                
+                if self.record_path:
+                    if self.recorder is None:
+                        self.recorder = SessionRecorder(self.record_path, captured.shape)
+                    self.recorder.write(captured, self.hand_tracker.landmarks, key, frame_time)
                 
                 # Handle keyboard input
-                key = cv2.waitKey(1) & 0xFF
-                if key != 255:
+                if key != NO_KEY:
                     self._handle_keyboard_input(key)
+                self.latency.lap('other')
                 
-                # Control frame rate
-                if TARGET_FPS > 0:
-                    time.sleep(1.0 / TARGET_FPS)
+                # Control frame rate (sleeps only until the next deadline)
+                self.frame_pacer.wait()
+                self.latency.lap('pacing')
+                self.latency.end_frame()
         
         except KeyboardInterrupt:
             print("\nApplication interrupted by user.")
         
         except Exception as e:
             print(f"Error in main loop: {e}")
+            self.error = e
         
         finally:
             self.cleanup()
@@ -273,19 +405,91 @@ class VirtualPainter:
         """Clean up resources."""
         print("Cleaning up...")
         
+        if self.frame_grabber:
+            self.frame_grabber.stop()
+            stats = self.frame_grabber.get_stats()
+            print(f"Capture: {stats['frames_captured']} frames, "
+                  f"{stats['frames_dropped']} dropped, "
+                  f"{stats['frames_duplicated']} duplicated")
+        
+        pacing = self.frame_pacer.get_stats()
+        if not pacing['uncapped']:
+            print(f"Pacing: {pacing['missed_deadlines']} of {pacing['frames']} "
+                  f"frame deadlines missed")
+        
         if self.cap:
             self.cap.release()
         
+        if self.recorder:
+            self.recorder.close()
+            print(f"Session recorded: {self.recorder.frames} frames to {self.record_path}")
+        
+        if self.writer:
+            self.writer.close()
+            canvas_path = os.path.splitext(self.output_path)[0] + "_canvas.png"
+            cv2.imwrite(canvas_path, self.canvas_manager.get_canvas())
+            elapsed = time.perf_counter() - self.start_time
+            print(f"Rendered {self.writer.frames_written} frames to {self.output_path} in {elapsed:.2f}s "
+                  f"({self.cap.frames_read / max(elapsed, 1e-9):.1f} FPS processed)")
+            print(f"Final canvas saved to {canvas_path}")
+        
+        if self.player is not None and self.frame_pacer.frames:
+            elapsed = time.perf_counter() - self.start_time
+            print(f"Replay: {self.player.position} frames in {elapsed:.2f}s "
+                  f"({self.player.position / max(elapsed, 1e-9):.1f} FPS)")
+        
         if self.hand_tracker:
-            self.hand_tracker.release()
+            tracking = self.hand_tracker.get_stats()
+            if self.hand_tracker.roi_tracking:
+                print(f"ROI tracking: {tracking['roi_hits']} hits, {tracking['roi_misses']} misses")
+            if tracking['inference_frames'] < tracking['frames']:
+                print(f"Inference: {tracking['inference_frames']} of {tracking['frames']} frames, "
+                      f"{tracking['inference_time'] * 1000:.1f} ms each")
+            if tracking['gate']:
+                gate = tracking['gate']
+                print(f"Motion gate: idle for {gate['gated_frames']} of {gate['frames']} frames "
+                      f"({gate['gated_time']:.1f}s)")
+            if self.owns_hand_tracker:
+                self.hand_tracker.release()
         
-        cv2.destroyAllWindows()
+        if self.display:
+            self.display.stop()
+            stats = self.display.get_stats()
+            print(f"Display: {stats['frames_shown']} frames shown, {stats['frames_dropped']} dropped, "
+                  f"{stats['canvas_updates']} canvas updates")
+        
+        if self.latency.stages:
+            print("Frame latency (ms):")
+            for line in self.latency.format_lines():
+                print(f"  {line}")
+            if self.latency.export_path:
+                self.latency.export()
+                print(f"Latency metrics written to {self.latency.export_path}")
         print("Cleanup complete.")
 
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="Enhanced Virtual Painter")
+    parser.add_argument('--source', default=FRAME_SOURCE,
+                        help="frame source: camera[:index], video:path, images:directory, "
+                             "synthetic[:frames] or shm:name (default: %(default)s)")
+    parser.add_argument('--record', metavar='FILE', help="record the session to FILE")
+    parser.add_argument('--replay', metavar='FILE', help="replay a recorded session instead of the camera")
+    parser.add_argument('--realtime', action='store_true', help="replay at the recorded speed")
+    parser.add_argument('--replay-inference', action='store_true',
+                        help="re-run hand inference on replayed frames instead of using recorded landmarks")
+    parser.add_argument('--headless', action='store_true', help="run without opening windows")
+    parser.add_argument('--output', metavar='FILE',
+                        help="render the input to a video FILE as fast as possible (implies --headless)")
+    parser.add_argument('--metrics', metavar='FILE', default=LATENCY_EXPORT_PATH,
+                        help="periodically write stage latencies to FILE (.prom for Prometheus, else CSV)")
+    args = parser.parse_args()
+    
     try:
-        painter = VirtualPainter()
+        painter = VirtualPainter(source=args.source, record_path=args.record, replay_path=args.replay,
+                                 realtime=args.realtime, headless=args.headless,
+                                 replay_inference=args.replay_inference,
+                                 metrics_path=args.metrics, output_path=args.output)
         painter.run()
     except Exception as e:
         print(f"Fatal error: {e}")